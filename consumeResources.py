@@ -23,75 +23,398 @@ import tempfile
 from array import array
 from random import Random
 import os
+import io
+import mmap
+import errno
+import ctypes
+import ctypes.util
+import socket
+import signal
 import logging
+import multiprocessing
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.DEBUG)
 
 
+# Elements processed by each cycle of a NumPy kernel, small enough that a cycle takes a few milliseconds.
+NUMPY_BLOCK_SIZE = 1 << 20
+# Element strides used by successive sweeps over the array, from contiguous up to one element in every other cache
+# line.
+NUMPY_STRIDES = [1, 2, 4, 8, 16]
+# Bytes of random data generated at a time while filling the CPU arrays, which bounds the extra memory used in setup.
+FILL_CHUNK_SIZE = 16 * 1024 * 1024
+
+PAGE_SIZE = 4096
+CACHE_LINE_SIZE = 64
+# Bytes read or written by each access of the memory module.
+MEMORY_CHUNK_SIZE = 1024 * 1024
+# Size of each block read or written by the random pattern of the memory module.
+MEMORY_RANDOM_BLOCK_SIZE = 64 * 1024
+# Bytes of the working set covered by each access of the page-touch pattern of the memory module.
+MEMORY_PAGE_TOUCH_SIZE = 64 * 1024 * 1024
+FILL_BYTE = "\x5a"
+# Never written by the memory or disk modules, so reads that scan for it go through the whole range.
+UNUSED_BYTE = "\xa5"
+# Bytes moved by each stream read or write of the disk module, in blocks of DISK_BLOCK_SIZE.
+DISK_STREAM_SIZE = 200 * 1024 * 1024
+DISK_BLOCK_SIZE = 1024 * 1024
+# Each random read or write of the disk module is a batch of DISK_RANDOM_BATCH I/Os of DISK_RANDOM_SIZE bytes.
+DISK_RANDOM_SIZE = 4096
+DISK_RANDOM_BATCH = 256
+
+
 class Test:
+    # Modules that measure their throughput add to _bytes in each test_cycle, and those that also count operations name
+    # the kind of operation and add to _ops.
+    op_name = None
+    _ops = 0
+    _bytes = 0
+
     def test(self, cycle_time):
         logging.debug("Starting test cycle for module: %s for %s seconds" % (self.name, cycle_time))
-        run_until = time.time() + cycle_time
+        self._ops = 0
+        self._bytes = 0
+        start = time.time()
+        run_until = start + cycle_time
         while time.time() <= run_until:
             self.test_cycle()
-
-
-class CPUIntegerTest(Test):
-    name = "Cpu Integer Module"
-
-    def __init__(self, memory):
-        logging.info("Initializing Integer Module: creating array")
-        self._memory = memory
-        self._data = array('L')
+        self.log_rate(time.time() - start)
+
+    def log_rate(self, elapsed):
+        if self._bytes == 0 or elapsed <= 0:
+            return
+        rates = []
+        if self.op_name is not None:
+            rates.append("%.1f M%s/s" % (self._ops / elapsed / 1e6, self.op_name))
+        rates.append("%.3f GB/s" % (self._bytes / elapsed / 1e9))
+        logging.info("%s: %s" % (self.name, ", ".join(rates)))
+
+
+class CPUTest(Test):
+    """
+    Base for the CPU modules.  The kernel is either "numpy", which sweeps over the whole array in blocks using NumPy
+    ufuncs, or "array", which updates one element of an array.array at a time using the interpreter.
+    """
+
+    def __init__(self, memory, kernel):
+        self._memory = int(memory * 1024 * 1024)
+        self._kernel = kernel
         self._rand = Random()
-        while (len(self._data) * self._data.itemsize) <= self._memory:
-            self._data.append(self._rand.randint(0, 0xFFFFFFFFFFFFFFFF))
-        self._num_elements = len(self._data)
         self._cur_element = 0
-        logging.info("Initializing Integer Module: Created array")
+        self._offset = 0
+        self._stride_index = 0
+        logging.info("Initializing %s: Creating array" % self.name)
+        start = time.time()
+        if kernel == "numpy":
+            self._data = self._create_numpy_array(max(1, self._memory // 8))
+            self.test_cycle = self._numpy_cycle
+        else:
+            self._data = self._create_array(max(1, self._memory // array(self.typecode).itemsize))
+            self.test_cycle = self._array_cycle
+        self._num_elements = len(self._data)
+        logging.info("Initializing %s: Created %.1f MB array in %.2f seconds" % (
+            self.name, self._num_elements * self._data.itemsize / 1048576.0, time.time() - start))
+
+    def _next_block(self):
+        """
+        Returns a view of the next block of the array to process.  Each pass over the array uses the next stride, and
+        is made up of one sweep from each offset within the stride, so that every pass touches every element once.
+        """
+        stride = NUMPY_STRIDES[self._stride_index]
+        start = self._offset + self._cur_element * stride
+        block = self._data[start:start + NUMPY_BLOCK_SIZE * stride:stride]
+        self._cur_element += len(block)
+        if start + NUMPY_BLOCK_SIZE * stride >= self._num_elements:
+            self._cur_element = 0
+            self._offset += 1
+            if self._offset >= stride:
+                self._offset = 0
+                self._stride_index = (self._stride_index + 1) % len(NUMPY_STRIDES)
+        return block
 
-    def test_cycle(self):
+    def _next_element(self):
+        self._cur_element += 1
+        if self._cur_element >= self._num_elements:
+            self._cur_element = 0
+
+
+class CPUIntegerTest(CPUTest):
+    name = "Cpu Integer Module"
+    op_name = "IOP"
+    typecode = 'L'
+
+    # Multiplier and increment of Knuth's MMIX linear congruential generator, followed by an xorshift so that the high
+    # bits feed back into the low bits.
+    MULTIPLIER = 6364136223846793005
+    INCREMENT = 1442695040888963407
+    SHIFT = 29
+
+    def __init__(self, memory, kernel="array"):
+        CPUTest.__init__(self, memory, kernel)
+        if kernel == "numpy":
+            self._scratch = numpy.empty(NUMPY_BLOCK_SIZE, dtype=numpy.uint64)
+            self._multiplier = numpy.uint64(self.MULTIPLIER)
+            self._increment = numpy.uint64(self.INCREMENT)
+            self._shift = numpy.uint64(self.SHIFT)
+
+    def _create_array(self, num_elements):
+        # Random bytes are valid unsigned integers, so the array is filled straight from the kernel's random source.
+        data = array(self.typecode)
+        step = FILL_CHUNK_SIZE // data.itemsize
+        while len(data) < num_elements:
+            data.fromstring(os.urandom(min(step, num_elements - len(data)) * data.itemsize))
+        return data
+
+    def _create_numpy_array(self, num_elements):
+        data = numpy.empty(num_elements, dtype=numpy.uint64)
+        step = FILL_CHUNK_SIZE // data.itemsize
+        for start in xrange(0, num_elements, step):
+            chunk = data[start:start + step]
+            chunk[:] = numpy.frombuffer(os.urandom(len(chunk) * data.itemsize), dtype=numpy.uint64)
+        return data
+
+    def _numpy_cycle(self):
+        block = self._next_block()
+        scratch = self._scratch[:len(block)]
+        numpy.multiply(block, self._multiplier, out=block)
+        numpy.add(block, self._increment, out=block)
+        numpy.right_shift(block, self._shift, out=scratch)
+        numpy.bitwise_xor(block, scratch, out=block)
+        # Multiply, add, shift and xor, reading and writing nine words between them.
+        self._ops += 4 * len(block)
+        self._bytes += 9 * 8 * len(block)
+
+    def _array_cycle(self):
         for i in xrange(1000):
             try:
                 self._data[self._cur_element] += self._rand.randint(0, 0xFFFFFFFFFFFFFFFF)
             except OverflowError:
                 self._data[self._cur_element] = self._rand.randint(0, 0xFFFFFFFFFFFFFFFF)
-        self._cur_element += 1
-        if self._cur_element >= self._num_elements:
-            self._cur_element = 0
+        self._ops += 1000
+        self._bytes += 2 * 1000 * self._data.itemsize
+        self._next_element()
 
 
-class CPUFloatTest(Test):
+class CPUFloatTest(CPUTest):
     name = "Cpu Floating Point Module"
+    op_name = "FLOP"
+    typecode = 'd'
+
+    # x * A + B converges on B / (1 - A) = 1, so the values stay normal however long the module runs.
+    A = 0.999999
+    B = 0.000001
+
+    def __init__(self, memory, kernel="array"):
+        CPUTest.__init__(self, memory, kernel)
+
+    def _create_array(self, num_elements):
+        # Random bytes would include NaNs and denormals, so one chunk of random numbers is generated and repeated.
+        chunk = array(self.typecode, (self._rand.random() for i in xrange(
+            min(num_elements, FILL_CHUNK_SIZE // array(self.typecode).itemsize))))
+        data = chunk * (num_elements // len(chunk))
+        data.extend(chunk[:num_elements % len(chunk)])
+        return data
+
+    def _create_numpy_array(self, num_elements):
+        return numpy.random.random(num_elements)
+
+    def _numpy_cycle(self):
+        block = self._next_block()
+        numpy.multiply(block, self.A, out=block)
+        numpy.add(block, self.B, out=block)
+        # A multiply-add, reading and writing the block twice.
+        self._ops += 2 * len(block)
+        self._bytes += 4 * 8 * len(block)
+
+    def _array_cycle(self):
+        for i in xrange(1000):
+            self._data[self._cur_element] /= self._rand.random()
+        self._ops += 1000
+        self._bytes += 2 * 1000 * self._data.itemsize
+        self._next_element()
+
+
+# The CPU module run by this process when it is a worker of a CPUPoolTest, and the start barrier shared with the pool.
+_worker_test = None
+_worker_arrived = None
+_worker_start = None
+
+
+def _init_cpu_worker(test_class, memory, kernel, arrived, start):
+    global _worker_test, _worker_arrived, _worker_start
+    # The parent handles Ctrl-C, and terminates the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_test = test_class(memory, kernel)
+    _worker_arrived = arrived
+    _worker_start = start
+
+
+def _run_cpu_worker(cycle_time):
+    # Wait until every cycle has been taken before starting, a worker waiting here cannot take a second one.
+    _worker_arrived.release()
+    _worker_start.wait()
+    _worker_test.test(cycle_time)
 
-    def __init__(self, memory):
-        logging.info("Initializing Floating Point Module: Creating array")
-        self._memory = memory
-        self._data = array('d')
+
+class CPUPoolTest(Test):
+    """
+    Runs a CPU module in each of a pool of worker processes, so that the load is spread over as many cores as the job
+    was given.  Each worker creates its own array, with the memory divided equally between them.
+    """
+
+    def __init__(self, test_class, memory, cores, kernel):
+        logging.info("Initializing %s on %d cores" % (test_class.name, cores))
+        self.name = "%s (%d cores)" % (test_class.name, cores)
+        self._cores = cores
+        self._arrived = multiprocessing.Semaphore(0)
+        self._start = multiprocessing.Event()
+        self._pool = multiprocessing.Pool(cores, _init_cpu_worker,
+                                          (test_class, float(memory) / cores, kernel, self._arrived, self._start))
+
+    def test(self, cycle_time):
+        logging.debug("Starting test cycle for module: %s for %s seconds" % (self.name, cycle_time))
+        # One cycle per worker.  Workers hold their cycle until all of them have arrived, so no worker can take two
+        # while another is idle.  Timeouts are given so that Ctrl-C is not blocked while waiting.
+        self._start.clear()
+        result = self._pool.map_async(_run_cpu_worker, [cycle_time] * self._cores, chunksize=1)
+        for i in range(self._cores):
+            if not self._arrived.acquire(True, 3600):
+                raise RuntimeError("CPU workers did not start within an hour")
+        self._start.set()
+        result.get(cycle_time + 3600)
+
+    def close(self):
+        self._pool.terminate()
+
+
+class MemoryTest(Test):
+    """
+    Reads and writes a working set of memory, without doing any arithmetic on it.  The pattern is one of:
+
+    sequential: Each access is the next MEMORY_CHUNK_SIZE bytes of the working set.
+    random: Each access is MEMORY_CHUNK_SIZE bytes made up of MEMORY_RANDOM_BLOCK_SIZE blocks at random offsets.
+    page: Each access touches one byte in every page of the next MEMORY_PAGE_TOUCH_SIZE bytes, each pass over the
+        working set uses the next cache line within the page.  A touch is counted as a cache line of bandwidth.
+    """
+    name = "Memory Module"
+
+    def __init__(self, size, pattern, read_ratio, write_ratio):
+        logging.info("Initializing Memory Module: Creating %d MB working set" % size)
+        start = time.time()
+        self._size = max(size * 1024 * 1024, MEMORY_CHUNK_SIZE)
+        # Reads scan for a byte that is never written, so each read goes through the whole range.
+        self._data = bytearray(FILL_BYTE) * self._size
+        # Writes copy from a view of the block, so that slicing it does not make a copy first.
+        self._block = memoryview(bytearray(FILL_BYTE) * MEMORY_CHUNK_SIZE)
+        logging.info("Initializing Memory Module: Created working set in %.2f seconds" % (time.time() - start))
         self._rand = Random()
-        while (len(self._data) * self._data.itemsize) <= self._memory:
-            self._data.append(self._rand.random())
-        self._num_elements = len(self._data)
-        self._cur_element = 0
-        logging.info("Initializing Floating Point Module: Created array")
+        self._cur_offset = 0
+        self._touch_offset = 0
+        self.pattern = pattern
+        if pattern == "page":
+            self.op_name = "page"
+        self.read_ratio = read_ratio
+        self.write_ratio = write_ratio
 
     def test_cycle(self):
-        for i in xrange(1000):
-            self._data[self._cur_element] /= self._rand.random()
-        self._cur_element += 1
-        if self._cur_element >= self._num_elements:
-            self._cur_element = 0
+        for i in xrange(self.read_ratio):
+            self._access(False)
+        for i in xrange(self.write_ratio):
+            self._access(True)
+
+    def _access(self, write):
+        operation = self._write if write else self._read
+        if self.pattern == "sequential":
+            if self._cur_offset + MEMORY_CHUNK_SIZE > self._size:
+                self._cur_offset = 0
+            operation(self._cur_offset, self._cur_offset + MEMORY_CHUNK_SIZE)
+            self._cur_offset += MEMORY_CHUNK_SIZE
+        elif self.pattern == "random":
+            for i in xrange(MEMORY_CHUNK_SIZE // MEMORY_RANDOM_BLOCK_SIZE):
+                offset = self._rand.randint(0, self._size - MEMORY_RANDOM_BLOCK_SIZE) & ~(CACHE_LINE_SIZE - 1)
+                operation(offset, offset + MEMORY_RANDOM_BLOCK_SIZE)
+        else:
+            start = self._cur_offset + self._touch_offset
+            end = min(self._cur_offset + MEMORY_PAGE_TOUCH_SIZE, self._size)
+            self._touch(start, end, write)
+            self._cur_offset += MEMORY_PAGE_TOUCH_SIZE
+            if self._cur_offset >= self._size:
+                self._cur_offset = 0
+                self._touch_offset = (self._touch_offset + CACHE_LINE_SIZE) % PAGE_SIZE
+
+    def _read(self, start, end):
+        self._data.find(UNUSED_BYTE, start, end)
+        self._bytes += end - start
+
+    def _write(self, start, end):
+        self._data[start:end] = self._block[:end - start]
+        self._bytes += end - start
+
+    def _touch(self, start, end, write):
+        pages = len(xrange(start, end, PAGE_SIZE))
+        if write:
+            self._data[start:end:PAGE_SIZE] = self._block[:pages]
+        else:
+            self._data[start:end:PAGE_SIZE]
+        self._ops += pages
+        self._bytes += pages * CACHE_LINE_SIZE
+
+
+def preallocate(fd, size):
+    """
+    Reserves size bytes of disk for the file using posix_fallocate, which Python 2 does not wrap, so that the file is
+    laid out in one go and a full disk is found straight away.  Falls back to ftruncate when the C library or the file
+    system does not support it.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fallocate = getattr(libc, "posix_fallocate64", None) or libc.posix_fallocate
+    except (OSError, AttributeError):
+        fallocate = None
+    if fallocate is not None:
+        fallocate.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        # posix_fallocate returns the error rather than setting errno.
+        error = fallocate(fd, 0, size)
+        if error == 0:
+            return
+        if error not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            raise OSError(error, os.strerror(error))
+    os.ftruncate(fd, size)
 
 
 class DiskTest(Test):
+    """
+    Streams through, and does random I/O on, a temporary file.  All I/O goes through one block of data and one read
+    buffer that are created up front, so memory use does not depend on the size of the file.  When use_mmap is set the
+    file is mapped and accessed through the mapping instead of read and write calls, the pages of the file that have
+    been touched then count towards the resident size of the process.
+    """
     name = "Data IO Module"
 
-    def __init__(self, size, directory, sw_ratio, sr_ratio, rr_ratio, rw_ratio):
+    def __init__(self, size, directory, sw_ratio, sr_ratio, rr_ratio, rw_ratio, use_mmap=False):
         logging.info("Initializing Disk Module: Creating File")
-        self._file = tempfile.TemporaryFile(dir=directory, suffix="bench.%s" % os.getpid())
-        self.file_size = size * 1024 * 1024
-        self._file.write("\0" * self.file_size)
-        logging.info("Initializing Disk Module: Created File")
+        start = time.time()
+        self.file_size = max(size * 1024 * 1024, DISK_BLOCK_SIZE)
+        fd, path = tempfile.mkstemp(dir=directory, suffix="bench.%s" % os.getpid())
+        os.unlink(path)
+        self._file = io.FileIO(fd, "r+")
+        # Random data is written so that compressing file systems still do the I/O.
+        self._block = os.urandom(DISK_BLOCK_SIZE).replace(UNUSED_BYTE, FILL_BYTE)
+        self._buffer = memoryview(bytearray(DISK_BLOCK_SIZE))
+        self._rand = Random()
+        self._map = None
+        preallocate(fd, self.file_size)
+        self._stream(0, self.file_size, self._write_block)
+        if use_mmap:
+            self._map = mmap.mmap(fd, self.file_size)
+        logging.info("Initializing Disk Module: Created %d MB File in %.2f seconds" % (
+            self.file_size / 1048576, time.time() - start))
+        self._read_offset = 0
+        self._write_offset = 0
         self.sw_ratio = sw_ratio
         self.sr_ratio = sr_ratio
         self.rr_ratio = rr_ratio
@@ -107,44 +430,69 @@ class DiskTest(Test):
         for i in range(self.rw_ratio):
             self._random_write()
 
+    def log_rate(self, elapsed):
+        if elapsed <= 0:
+            return
+        logging.info("%s: %.1f MB/s, %.0f IOPS" % (self.name, self._bytes / elapsed / 1048576, self._ops / elapsed))
+
     def _random_write(self):
         logging.debug("Starting Random Write.")
-        r = Random()
-        self._file.seek(r.randint(0, self.file_size))
-        self._file.write("\0" * 1024)
+        self._random(self._write_block)
         logging.debug("Finished Random Write.")
+
     def _random_read(self):
         logging.debug("Starting Random Read.")
-        r = Random()
-        self._file.seek(r.randint(0, self.file_size))
-        data = self._file.read(1024)
+        self._random(self._read_block)
         logging.debug("Finished Random Read.")
 
     def _serial_read(self):
         logging.debug("Starting Serial Read.")
-        self._file.seek(0)
-        total = 200 * 1024 * 1024
-        while ( total > 0):
-            data = self._file.read(total)
-            total -= len(data)
+        self._read_offset = self._stream(self._read_offset, DISK_STREAM_SIZE, self._read_block)
         logging.debug("Finished Serial Read.")
 
     def _serial_write(self):
         logging.debug("Starting Serial Write.")
-        # Write ~200Mb of data
-        self._file.seek(0)
-        r = Random()
-        written = 0
-        location = 0
-        while written < 200:
-            print "loop: %s"  % written
-            self._file.write("X" * 1024*1024*10)
-            written += 10
-            location += 1024 * 1024 * 10
-            if location > self.file_size:  # don't get too big
-                self._file.seek(0)
+        self._write_offset = self._stream(self._write_offset, DISK_STREAM_SIZE, self._write_block)
         logging.debug("Finished Serial Write.")
 
+    def _stream(self, offset, total, operation):
+        """
+        Reads or writes total bytes in blocks, starting at offset and wrapping around at the end of the file, and
+        returns the offset that the next stream should start from.
+        """
+        while total > 0:
+            if offset >= self.file_size:
+                offset = 0
+            length = min(DISK_BLOCK_SIZE, total, self.file_size - offset)
+            operation(offset, length)
+            offset += length
+            total -= length
+        return offset
+
+    def _random(self, operation):
+        for i in xrange(DISK_RANDOM_BATCH):
+            operation(self._rand.randrange(self.file_size // DISK_RANDOM_SIZE) * DISK_RANDOM_SIZE, DISK_RANDOM_SIZE)
+
+    def _read_block(self, offset, length):
+        if self._map is not None:
+            self._map.find(UNUSED_BYTE, offset, offset + length)
+        else:
+            self._file.seek(offset)
+            self._file.readinto(self._buffer[:length])
+        self._ops += 1
+        self._bytes += length
+
+    def _write_block(self, offset, length):
+        if self._map is not None:
+            # mmap only accepts a string of the same length as the slice.
+            self._map[offset:offset + length] = self._block if length == DISK_BLOCK_SIZE else self._block[:length]
+        else:
+            self._file.seek(offset)
+            self._file.write(buffer(self._block, 0, length))
+        self._ops += 1
+        self._bytes += length
+
+
 class NetworkTest(Test):
     name = "Network IO Module"
     def __init__(self):
@@ -180,6 +528,45 @@ class NetworkTest(Test):
 
 
 
+def get_scheduler_hosts():
+    """
+    Returns the hosts given to the job, as a list of (host, slots), or an empty list if the scheduler did not provide a
+    host list.
+    """
+    hosts = []
+    # OpenLava lists the slots on each host as "host1 4 host2 2 ..."
+    words = os.environ.get("LSB_MCPU_HOSTS", "").split()
+    hosts.extend(zip(words[::2], words[1::2]))
+    # SGE lists one host per line of the PE host file, as "host slots queue processors"
+    if os.environ.get("PE_HOSTFILE"):
+        try:
+            with open(os.environ["PE_HOSTFILE"]) as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 2:
+                        hosts.append((fields[0], fields[1]))
+        except IOError:
+            logging.warning("Unable to read PE_HOSTFILE: %s" % os.environ["PE_HOSTFILE"])
+    return [(host.split(".")[0], int(slots)) for host, slots in hosts if slots.isdigit()]
+
+
+def get_default_cores():
+    """
+    Returns the number of slots the scheduler gave the job on this host, or one if not running under a scheduler.
+    NSLOTS and LSB_DJOB_NUMPROC are totals for the whole job, so they are only used when the job has a single host.
+    """
+    hosts = get_scheduler_hosts()
+    local_host = socket.gethostname().split(".")[0]
+    local_slots = sum(slots for host, slots in hosts if host == local_host)
+    if local_slots > 0:
+        return local_slots
+    if len(set(host for host, slots in hosts)) <= 1:
+        for name in ["NSLOTS", "LSB_DJOB_NUMPROC"]:
+            if os.environ.get(name, "").isdigit():
+                return int(os.environ[name])
+    return 1
+
+
 def get_ratio(a, b):
     if a == 0:
         return 0
@@ -211,7 +598,28 @@ parser.add_argument("--cpu_fpoint_ratio", type=int, default=1,
                     help="Ratio of CPU time to spend on floating point calculations")
 parser.add_argument("--cpu_integer_ratio", type=int, default=1,
                     help="Ratio of CPU time to spend on integer calculations")
-parser.add_argument("-m", "--memory", type=int, default=2048, help="Megabytes of RAM to consume")
+parser.add_argument("-m", "--memory", type=int, default=256,
+                    help="Megabytes of RAM used by the arrays of the CPU modules in total.  It is split between the "
+                         "floating point and integer modules by their ratios, then between the cores used by each.  "
+                         "The memory and data modules are sized separately")
+parser.add_argument("--cpu_kernel", choices=["auto", "numpy", "array"], default="auto",
+                    help="How the CPU modules do their work, auto uses numpy when it is installed")
+parser.add_argument("--cores", type=int, default=get_default_cores(),
+                    help="Number of cores to burn CPU time on, defaults to the number of slots given by the scheduler")
+
+parser.add_argument("--enable_memory", action="store_true", default=False,
+                    help="Read and write memory, without doing any calculations")
+parser.add_argument("--memory_ratio", type=int, default=1,
+                    help="What ratio of time to spend on memory bandwidth")
+parser.add_argument("--memory_working_set", type=int, default=1024,
+                    help="Megabytes of RAM read and written by the memory module")
+parser.add_argument("--memory_pattern", choices=["sequential", "random", "page"], default="sequential",
+                    help="How the memory module accesses its working set: sequential blocks, blocks at random "
+                         "offsets, or one byte of every page")
+parser.add_argument("--memory_read_ratio", type=int, default=1,
+                    help="Ratio of memory accesses that are reads")
+parser.add_argument("--memory_write_ratio", type=int, default=1,
+                    help="Ratio of memory accesses that are writes")
 
 parser.add_argument("-d", "--enable_data", action="store_true", default=False,
                     help="Perform data read/write operations")
@@ -222,6 +630,8 @@ system_ram_size = 4096
 
 parser.add_argument("--data_dir", default=system_tmp_dir, help="Directory to use for writing data")
 parser.add_argument("--data_size", type=int, default=system_ram_size * 2, help="Size of data files in MB")
+parser.add_argument("--data_mmap", action="store_true", default=False,
+                    help="Access the data file through mmap rather than read and write calls")
 parser.add_argument("--data_stream_write_ratio", type=int, default=1,
                     help="Ratio of disk time to spend writing stream data")
 parser.add_argument("--data_stream_read_ratio", type=int, default=1,
@@ -235,22 +645,44 @@ parser.add_argument("--cycle_time", type=int, default=60, help="Amount of time t
 
 args = parser.parse_args()
 
+if args.cpu_kernel == "auto":
+    args.cpu_kernel = "array" if numpy is None else "numpy"
+elif args.cpu_kernel == "numpy" and numpy is None:
+    parser.error("The numpy CPU kernel requires numpy to be installed.")
+
 tests = []
 
+def create_cpu_test(test_class, memory):
+    if args.cores > 1:
+        return CPUPoolTest(test_class, memory, args.cores, args.cpu_kernel)
+    return test_class(memory, args.cpu_kernel)
+
 if args.enable_cpu:
+    # --memory is split between the two modules in the same proportion as their time.
+    fpoint_share = get_ratio(args.cpu_fpoint_ratio, (args.cpu_integer_ratio + args.cpu_fpoint_ratio))
+    integer_share = get_ratio(args.cpu_integer_ratio, (args.cpu_integer_ratio + args.cpu_fpoint_ratio))
     logging.info("Configuring FP math module")
     tests.append(
         (
-
-            CPUFloatTest(args.memory),
-            get_ratio(args.cpu_fpoint_ratio, (args.cpu_integer_ratio + args.cpu_fpoint_ratio)) * args.cpu_ratio,
+            create_cpu_test(CPUFloatTest, args.memory * fpoint_share),
+            fpoint_share * args.cpu_ratio,
         )
     )
     logging.info("Configuring Integer math module")
     tests.append(
         (
-            CPUIntegerTest(args.memory),
-            get_ratio(args.cpu_integer_ratio, (args.cpu_integer_ratio + args.cpu_fpoint_ratio)) * args.cpu_ratio,
+            create_cpu_test(CPUIntegerTest, args.memory * integer_share),
+            integer_share * args.cpu_ratio,
+        )
+    )
+
+if args.enable_memory:
+    logging.info("Configuring Memory Module")
+    tests.append(
+        (
+            MemoryTest(args.memory_working_set, args.memory_pattern, read_ratio=args.memory_read_ratio,
+                       write_ratio=args.memory_write_ratio),
+            args.memory_ratio
         )
     )
 
@@ -260,7 +692,7 @@ if args.enable_data:
         (
             DiskTest(args.data_size, directory=args.data_dir, sw_ratio=args.data_stream_write_ratio,
                      sr_ratio=args.data_stream_read_ratio, rr_ratio=args.data_random_read_ratio,
-                     rw_ratio=args.data_random_write_ratio),
+                     rw_ratio=args.data_random_write_ratio, use_mmap=args.data_mmap),
             args.data_ratio
         )
     )
@@ -295,3 +727,7 @@ try:
 except KeyboardInterrupt:
     print "Aborted by user.  Shutting down...."
 
+for t in tests:
+    if isinstance(t[0], CPUPoolTest):
+        t[0].close()
+
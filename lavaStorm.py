@@ -66,9 +66,64 @@ The minimum number of processors each job should use.  Default 1
 
 The maximum number of processors each job should use.  Default 1
 
-.. option:: --delay_time
+.. option:: --poll_interval
 
-How long to wait before checking up on things. Default: 60 seconds.
+How long to wait, in seconds, between checks on the status of submitted jobs.  Jobs waiting in the submit queue are
+submitted as soon as they are due, regardless of this interval.  Default: 10 seconds.
+
+.. option:: --submit_concurrency
+
+The maximum number of jobs that may be in the process of being submitted at the same time.  When many jobs become due at
+once, for example a large batch, they are submitted in parallel so they reach the scheduler together.  Default: 1,
+jobs are submitted one at a time.
+
+.. option:: --scheduler_concurrency
+
+The maximum number of scheduler commands, such as qsub, qacct, bsub, or bjobs, that may run at the same time.  The
+command line interfaces run submissions, status queries, and kills concurrently up to this limit, rather than waiting
+for each command to finish before starting the next.  Default: 16.
+
+.. option:: --clock
+
+The clock used to time the run, one of real, accelerated, or simulated.  The accelerated clock runs --time_scale times
+faster than real time, the simulated clock moves forward instantly whenever LavaStorm would sleep.  Only the simulated
+scheduler can be used with an accelerated or simulated clock.  Default: real, or simulated for the simulated scheduler.
+
+.. option:: --time_scale
+
+How many times faster than real time the accelerated clock runs.  Default: 60.
+
+.. option:: --duration
+
+The number of seconds to run for, after which all active jobs are killed and LavaStorm exits.  When using the simulated
+scheduler this is simulated time.  Default: 0, run until interrupted.
+
+.. option:: --metrics_file
+
+A file to record metrics to.  After each poll cycle a sample is taken of the number of jobs submitted, the number of
+tasks in each state, the number of jobs waiting to be submitted, how long the poll took, and the mean and maximum time
+taken to submit a job since the previous sample.  Samples are appended to the file every few poll cycles, and when
+LavaStorm exits.  When running a storm, the counts are totals for the whole population.
+
+.. option:: --metrics_format
+
+The format of the metrics file, either csv, with a header row, or jsonl, one JSON object per line.  Default csv.
+
+.. option:: --metrics_buffer
+
+The number of samples kept in memory.  Default 1000.
+
+.. option:: --metrics_port
+
+A port on which to serve the most recent sample at /metrics, in the Prometheus text format.  Default: 0, disabled.
+
+.. option:: --latency_report
+
+A file to write a latency report to at the end of the run, as JSON.  For each queue and project, the report gives the
+count, mean, maximum, 50th, 95th and 99th percentiles, and a histogram of the queue wait, the time from submission until
+a task was first seen running, and the turnaround, the time from submission until a task was first seen finished, of
+every task that finished during the run.  Tasks are observed when they are polled, so times are accurate to within
+--poll_interval.  The percentiles are always logged at the end of the run.
 
 .. option:: --project
 
@@ -95,11 +150,26 @@ maximum values inclusive.  Default  1.
 
 .. option:: --scheduler
 
-The Scheduler interface to use, can be one of: sge_cli,openlava_cli,openlava_cluster_api,openlava_web,openlava_c_api
+The Scheduler interface to use, can be one of: sge_cli,openlava_cli,openlava_cluster_api,openlava_web,openlava_c_api,
+simulated
 
 Scheduler Specific Options
 --------------------------
 
+Sun Grid Engine Command Line Interface
+^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+.. option:: --qacct_grace_period
+
+The number of seconds a task may be missing from both qstat and qacct before it is assumed to have been killed.  A
+finished task is briefly in neither while its accounting record is written, during which it is counted as unknown and
+checked again on each poll cycle.  Default 30.
+
+.. option:: --sge_accounting_file
+
+The path to the SGE accounting file, usually $SGE_ROOT/$SGE_CELL/common/accounting.  When given, finished jobs are read
+from new records appended to the file each poll cycle, rather than by running qacct.
+
 Openlava Command Line Interface
 ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 
@@ -107,6 +177,18 @@ Openlava Command Line Interface
 
 The path to the bsub command, additional arguments can also be passed.
 
+.. option:: --lsb_acct_file
+
+The path to the OpenLava lsb.acct file.  When given, finished jobs are read from new records appended to lsb.acct each
+poll cycle, and bjobs only lists unfinished jobs.
+
+Openlava C API
+^^^^^^^^^^^^^^
+
+.. option:: --lsbatch_library
+
+The path to the OpenLava batch library.  Defaults to searching for liblsbatch in the standard library locations.
+
 Openlava Web
 ^^^^^^^^^^^^
 
@@ -122,6 +204,49 @@ The username of the account used when submitting jobs through openlava web.
 
 The password of the account used when submitting jobs through openlava web.
 
+.. option:: --web_connections
+
+The number of connections to keep open to the openlava web server.  Status queries for different jobs are made over
+these connections at the same time.  Default: 4.
+
+.. option:: --web_retries
+
+The number of times a status query that fails because the server can not be reached is retried.  Submissions
+are never retried.  Default: 3.
+
+.. option:: --web_retry_delay
+
+The number of seconds to wait before the first retry, the delay doubles for each further retry.  Default: 1.
+
+.. option:: --web_retry_timeout
+
+The maximum number of seconds spent waiting between the retries of a single request.  The last delay is shortened to
+fit, and no further retries are made once it is used up.  Default: 30.
+
+Simulated Cluster
+^^^^^^^^^^^^^^^^^
+
+The simulated scheduler models a cluster inside LavaStorm, and runs on a simulated clock, so that days of activity can
+be replayed in seconds.  Combine it with --duration so that the run ends.
+
+.. option:: --sim_hosts
+
+The number of hosts in the simulated cluster.  Default: 10.
+
+.. option:: --sim_slots_per_host
+
+The number of slots on each simulated host.  Default: 8.
+
+.. option:: --sim_queue
+
+A queue in the format NAME:PRIORITY, may be given multiple times.  Tasks in higher priority queues are dispatched
+first.  The first queue is used when a job does not specify one.  Default: a single queue named normal.
+
+.. option:: --sim_policy
+
+How tasks in the same queue are ordered for dispatch, either fifo, or fairshare, which favors the project using the
+fewest slots.  Default: fifo.
+
 Profile Specific Options
 ------------------------
 
@@ -158,29 +283,130 @@ The maximum number of jobs that should be submitted each time
 
 ..option:: --iterations
 
-The number of iterations to do before exiting.
+The number of iterations to do before finishing.  When run in a storm, the other profiles carry on until they have
+finished too.
+
+Storm
+^^^^^
+
+A storm runs a whole population of users in a single process.  Each user runs one of the profiles above, with its own
+queues, projects, office hours, and profile options.  All users share the scheduler interface, which is queried once
+per poll cycle for the entire population, and share the submission pool.
+
+Use a storm when you want to simulate many users without running a separate LavaStorm process for each.
+
+.. option:: population
+
+A JSON file containing a list of entries, each with the command line arguments of a profile and the number of users
+that run it.  For example::
+
+    [
+        {"count": 150, "arguments": "--office_hours 09:00:00-17:00:00 --queue normal baseload --base_load 2"},
+        {"count": 10, "arguments": "--queue short submitbatch --max_num_jobs_per_batch 200"}
+    ]
 
 """
 
 from random import randint, choice
 import time
+import os
 import sys
 import datetime
 import logging
 import argparse
 import re
 import subprocess
-from xml.dom import minidom
+import getpass
+import heapq
+import itertools
+import functools
+import collections
+import threading
+import tempfile
+import json
+import shlex
+import httplib
+import Queue
+import array
+import math
+import csv
+import BaseHTTPServer
+import ctypes
+import ctypes.util
+import signal
+from multiprocessing.pool import ThreadPool
+from xml.etree import cElementTree as ElementTree
 from olwclient import OpenLavaConnection, Job
 from openlavaweb.cluster.openlavacluster import Job as CJob
 
+# Job states.  Every task is in exactly one state, states from JOB_COMPLETED onwards are terminal.  The values are
+# small integers so that the state of every task in an array fits in a bytearray.  JOB_UNKNOWN is used for a task the
+# scheduler can not currently account for, which is checked again on the next poll cycle.
+JOB_PENDING = 0
+JOB_RUNNING = 1
+JOB_SUSPENDED = 2
+JOB_UNKNOWN = 3
+JOB_COMPLETED = 4
+JOB_FAILED = 5
+JOB_KILLED = 6
+
+JOB_STATE_NAMES = ("Pending", "Running", "Suspended", "Unknown", "Completed", "Failed", "Killed")
+
+# Job states for each state reported by OpenLava's bjobs.
+BJOBS_STATES = {
+    "PEND": JOB_PENDING,
+    "PSUSP": JOB_SUSPENDED,
+    "RUN": JOB_RUNNING,
+    "USUSP": JOB_SUSPENDED,
+    "SSUSP": JOB_SUSPENDED,
+    "DONE": JOB_COMPLETED,
+    "EXIT": JOB_FAILED,
+    "UNKWN": JOB_RUNNING,
+    "ZOMBI": JOB_RUNNING,
+}
+
+# Messages bjobs writes to stderr, with a non-zero exit status, when there is nothing to list rather than a failure.
+BJOBS_NOT_FOUND_MESSAGES = ("is not found", "No unfinished job found", "No job found", "No matching job found")
+
+# The largest number of jobs given to a single bkill or qdel command.
+KILL_BATCH_SIZE = 100
+
+
+def get_job_state(job):
+    """
+    Returns the state of a job object.  Job objects that do not have a state, such as those of openlava web, are given
+    one from their is_* attributes.
+    """
+    if isinstance(job, SimpleJob):
+        return job.state
+    if job.is_running:
+        return JOB_RUNNING
+    if job.is_suspended:
+        return JOB_SUSPENDED
+    if job.is_pending:
+        return JOB_PENDING
+    if job.is_completed:
+        return JOB_COMPLETED
+    if job.is_failed:
+        return JOB_FAILED
+    if job.was_killed:
+        return JOB_KILLED
+    raise ValueError("Job %s[%s] is not in any known state" % (job.job_id, job.array_index))
+
+
 class SimpleJob(object):
     """
     SimpleJob is a very simple job implementation providing just enough information for LavaStorm to make decisions, and
     no more.  Job Managers are free to either subclass SimpleJob, or use a different implementation entirely however
     the following methods and attributes MUST be implemented.
 
-    At least one of the following attributes must be true.  All must be defined.
+    SimpleJob holds a single state, one of the JOB_* constants, from which the is_* attributes are derived, so exactly
+    one of them is true.  Subclasses that add attributes should declare them in __slots__.
+
+    .. py:attribute:: state
+
+        The state of the job, one of JOB_PENDING, JOB_RUNNING, JOB_SUSPENDED, JOB_UNKNOWN, JOB_COMPLETED, JOB_FAILED
+        or JOB_KILLED.  A job in the JOB_UNKNOWN state has none of the is_* attributes set.
 
     .. py:attribute:: is_running
 
@@ -219,28 +445,275 @@ class SimpleJob(object):
         Kill the job using the job scheduler.
 
     """
+    __slots__ = ("job_id", "array_index", "state")
 
     def __init__(self, job_id, array_index, is_running=False, is_pending=False, is_completed=False, is_failed=False,
-                 is_suspended=False, was_killed=False):
-        self.is_running = is_running
-        self.is_pending = is_pending
-        self.is_completed = is_completed
-        self.is_failed = is_failed
-        self.is_suspended = is_suspended
-        self.was_killed = was_killed
+                 is_suspended=False, was_killed=False, state=None):
+        if state is None:
+            if is_running:
+                state = JOB_RUNNING
+            elif is_suspended:
+                state = JOB_SUSPENDED
+            elif is_pending:
+                state = JOB_PENDING
+            elif is_completed:
+                state = JOB_COMPLETED
+            elif is_failed:
+                state = JOB_FAILED
+            elif was_killed:
+                state = JOB_KILLED
+            else:
+                raise ValueError("Job %s[%s] is not in any known state" % (job_id, array_index))
+        self.state = state
         self.job_id = int(job_id)
         self.array_index = int(array_index)
 
+    @property
+    def is_running(self):
+        return self.state == JOB_RUNNING
+
+    @property
+    def is_pending(self):
+        return self.state == JOB_PENDING
+
+    @property
+    def is_completed(self):
+        return self.state == JOB_COMPLETED
+
+    @property
+    def is_failed(self):
+        return self.state == JOB_FAILED
+
+    @property
+    def is_suspended(self):
+        return self.state == JOB_SUSPENDED
+
+    @property
+    def was_killed(self):
+        return self.state == JOB_KILLED
+
     def kill(self):
         raise NotImplementedError
 
 
+class TaskRange(object):
+    """
+    TaskRange describes the tasks of a single submitted job, by its job id and an inclusive range of array indexes,
+    rather than one record per task.  A job that is not an array has the single array index zero.  Job managers return
+    a TaskRange from start_job, and profiles keep one in active_jobs for each job that still has active tasks.
+
+    The last known state of each task is kept in a bytearray, one byte per task, and a task is active until it reaches
+    a terminal state.  When states are recorded with the time they were observed, the time each task was first seen
+    pending, running, and finished is kept as well, in seconds since submit_time.
+
+    .. py:attribute:: job_id
+
+        The numerical Job ID
+
+    .. py:attribute:: first_index
+
+        The first array index of the job, zero if not an array.
+
+    .. py:attribute:: last_index
+
+        The last array index of the job, zero if not an array.
+
+    .. py:attribute:: submit_time
+
+        The time the job was submitted, set by the profile.
+
+    .. py:attribute:: queue_name
+
+        The queue the job was submitted to, or None for the default queue.
+
+    .. py:attribute:: project_name
+
+        The project the job was submitted to, or None for the default project.
+
+    """
+    __slots__ = ("job_id", "first_index", "last_index", "states", "_num_active", "submit_time", "queue_name",
+                 "project_name", "_times")
+
+    def __init__(self, job_id, first_index=0, last_index=None):
+        self.job_id = int(job_id)
+        self.first_index = int(first_index)
+        if last_index is None:
+            last_index = first_index
+        self.last_index = int(last_index)
+        # Every task starts as JOB_PENDING, which is zero.
+        self.states = bytearray(self.last_index - self.first_index + 1)
+        self._num_active = len(self.states)
+        self.submit_time = None
+        self.queue_name = None
+        self.project_name = None
+        # Times each task was first seen pending, running, and finished, three entries per task, or -1 if not yet
+        # seen.  None until the first time is recorded.
+        self._times = None
+
+    @classmethod
+    def for_job(cls, job_id, num_tasks):
+        """
+        Returns the range of a job submitted with num_tasks tasks, numbered from one if it is an array.
+        """
+        if num_tasks > 1:
+            return cls(job_id, 1, num_tasks)
+        return cls(job_id)
+
+    @property
+    def num_tasks(self):
+        """
+        The total number of tasks in the range, including finished tasks.
+        """
+        return len(self.states)
+
+    @property
+    def is_array(self):
+        return self.first_index > 0
+
+    def __len__(self):
+        return self._num_active
+
+    def __contains__(self, array_index):
+        return self.first_index <= array_index <= self.last_index and \
+            self.states[array_index - self.first_index] < JOB_COMPLETED
+
+    def __iter__(self):
+        """
+        Iterates over the array indexes of the tasks that are still active.
+        """
+        for offset, state in enumerate(self.states):
+            if state < JOB_COMPLETED:
+                yield self.first_index + offset
+
+    def __repr__(self):
+        if self.is_array:
+            return "%d[%d-%d]" % (self.job_id, self.first_index, self.last_index)
+        return "%d" % self.job_id
+
+    def runs(self):
+        """
+        Yields (first, last) for each run of consecutive array indexes of active tasks, so that the tasks can be
+        addressed as ranges, for example when killing them.
+        """
+        first = None
+        for array_index in self:
+            if first is None:
+                first = last = array_index
+            elif array_index == last + 1:
+                last = array_index
+            else:
+                yield first, last
+                first = last = array_index
+        if first is not None:
+            yield first, last
+
+    def get_state(self, array_index):
+        return self.states[array_index - self.first_index]
+
+    def set_state(self, array_index, state, now=None):
+        """
+        Records the state of a task, a task that reaches a terminal state is no longer active.  If now is given, and
+        submit_time is set, it is recorded as the time the task was first seen in that state.
+        """
+        offset = array_index - self.first_index
+        if self.states[offset] < JOB_COMPLETED <= state:
+            self._num_active -= 1
+        self.states[offset] = state
+
+        if now is None or self.submit_time is None or state == JOB_UNKNOWN:
+            return
+        if self._times is None:
+            self._times = array.array('d', [-1.0]) * (3 * len(self.states))
+        if state == JOB_PENDING:
+            i = 3 * offset
+        elif state < JOB_UNKNOWN:
+            i = 3 * offset + 1
+        else:
+            i = 3 * offset + 2
+        if self._times[i] < 0:
+            self._times[i] = max(0.0, (now - self.submit_time).total_seconds())
+
+    def get_times(self, array_index):
+        """
+        Returns the number of seconds after submission that the task was first seen pending, running and finished,
+        each None if the task has not been seen in that state.
+        """
+        if self._times is None:
+            return None, None, None
+        i = 3 * (array_index - self.first_index)
+        return tuple(t if t >= 0 else None for t in self._times[i:i + 3])
+
+
+class Clock(object):
+    """
+    The source of time for LavaStorm.  Profiles ask their clock for the current time and to sleep, rather than using
+    datetime and time directly, so that they can be run against simulated time.  This clock uses the system time.
+    """
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def sleep_until(self, wakeup):
+        """
+        Sleeps until the wakeup time, returns immediately if it has already passed.
+        """
+        delay = wakeup - self.now()
+        if delay > datetime.timedelta(0):
+            self.sleep(delay.total_seconds())
+
+
+class AcceleratedClock(Clock):
+    """
+    A clock that starts at the given time, or now, and then runs time_scale times faster than real time.  Sleeping
+    for a number of seconds on this clock takes time_scale times less real time.
+    """
+
+    def __init__(self, time_scale, start_time=None):
+        self.time_scale = float(time_scale)
+        self._start_time = start_time or datetime.datetime.now()
+        self._real_start_time = time.time()
+
+    def now(self):
+        elapsed = (time.time() - self._real_start_time) * self.time_scale
+        return self._start_time + datetime.timedelta(seconds=elapsed)
+
+    def sleep(self, seconds):
+        time.sleep(seconds / self.time_scale)
+
+
+class SimulatedClock(Clock):
+    """
+    A virtual clock that starts at the given time, or now, and only moves when sleep() is called, which advances the
+    clock and returns immediately.  Used to run profiles against the SimulatedJobManager many times faster than real
+    time.
+    """
+
+    def __init__(self, start_time=None):
+        self._now = start_time or datetime.datetime.now()
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        self._now += datetime.timedelta(seconds=seconds)
+
+
 class JobManager(object):
     """
     Job Managers are responsible for submitting, monitoring the state of, and killing jobs.
+
+    .. py:attribute:: supports_virtual_time
+
+        True if the job manager follows its clock rather than the system time, and so may be used with an accelerated
+        or simulated clock.
     """
+    supports_virtual_time = False
     def __init__(self):
         self.args = None
+        self.clock = Clock()
 
     @classmethod
     def add_argparse_arguments(cls, parser):
@@ -255,10 +728,24 @@ class JobManager(object):
         """
         self.args = parsed_args
 
+    def begin_poll_cycle(self):
+        """
+        Called once at the start of each status poll cycle, before get_job or get_jobs are called for that cycle.
+        Managers that can fetch the status of many jobs at once should discard any cached status here, so that the
+        next lookup takes a fresh snapshot from the scheduler.
+        """
+        pass
+
+    def prefetch_jobs(self, job_ids):
+        """
+        Called during a poll cycle with the ids of all jobs whose status is about to be requested.  Managers may use
+        this to fetch the status of those jobs together, rather than one at a time from get_jobs.
+        """
+        pass
+
     def start_job(self, num_tasks, requested_slots=None, project_name=None, command=None, queue_name=None):
         """
-        Submits jobs into the job scheduler, returns a list of submitted jobs as an array of dictionaries,
-        each element containing the job_id and array_index.
+        Submits a job into the job scheduler, returns a TaskRange describing the tasks of the submitted job.
         """
         raise NotImplementedError
 
@@ -268,6 +755,32 @@ class JobManager(object):
         """
         pass
 
+    def get_task_states(self, job_id):
+        """
+        Gets the state of every task of a specified job id.  Returns a list of (array_index, state) tuples, where state
+        is one of the JOB_* constants.  The default implementation takes the states from get_jobs, managers that
+        already hold the states should override this so that no job objects are created.
+        """
+        return [(job.array_index, get_job_state(job)) for job in self.get_jobs(job_id)]
+
+    def kill_jobs(self, task_ranges):
+        """
+        Kills the active tasks of every TaskRange in task_ranges, without checking whether they are still running
+        first.  Failures are logged rather than raised, as some tasks may have finished in the meantime, and one
+        failure must not stop the remaining jobs from being killed.
+
+        The default implementation kills each task through the job objects returned by get_jobs.  Job managers should
+        override it to kill many jobs with each request to the scheduler.
+        """
+        self.begin_poll_cycle()
+        for task_range in task_ranges:
+            try:
+                for job in self.get_jobs(task_range.job_id):
+                    if job.array_index in task_range:
+                        job.kill()
+            except Exception as e:
+                logging.warning("Unable to kill job %s: %s" % (task_range, e))
+
     def get_job(self, job_id, array_index):
         """
         Gets a single job specified by the job id and array index.  Returns an object that implements SimpleJob
@@ -275,14 +788,517 @@ class JobManager(object):
         pass
 
 
+class CommandRunner(object):
+    """
+    Runs scheduler commands as child processes.  Commands started from different threads, or passed together to
+    run_many(), execute at the same time, but no more than concurrency commands are ever running at once.
+    """
+
+    def __init__(self, concurrency=1):
+        self.concurrency = concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+    def _start(self, command, stdin=None):
+        logging.debug("Running command: %s" % " ".join(command))
+        try:
+            return subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except:
+            self._slots.release()
+            raise
+
+    def _finish(self, process):
+        try:
+            output, errors = process.communicate()
+        finally:
+            self._slots.release()
+        if errors:
+            logging.debug("Command wrote to stderr: %s" % errors)
+        return process.returncode, output
+
+    def run(self, command, stdin=None):
+        """
+        Runs a single command and returns its output.  Raises subprocess.CalledProcessError if the command fails.
+        """
+        self._slots.acquire()
+        returncode, output = self._finish(self._start(command, stdin))
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, output)
+        return output
+
+    def run_unchecked(self, command):
+        """
+        Runs a single command and returns a tuple of (returncode, output, errors), where errors is the standard error
+        of the command.  The exit status is returned rather than raised.
+        """
+        self._slots.acquire()
+        process = self._start(command)
+        try:
+            output, errors = process.communicate()
+        finally:
+            self._slots.release()
+        return process.returncode, output, errors
+
+    def stream(self, command, consumer):
+        """
+        Runs a single command, passing its standard output, as a file, to consumer while the command is still running,
+        and returns whatever consumer returns.  Used to parse large outputs without holding them in memory.  Raises
+        subprocess.CalledProcessError if the command fails, even if consumer raised first, as a failed command usually
+        writes nothing the consumer can parse.
+        """
+        self._slots.acquire()
+        logging.debug("Running command: %s" % " ".join(command))
+        consumer_error = None
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE)
+            try:
+                result = consumer(process.stdout)
+                # Drain anything the consumer did not read, so the command can exit.
+                while process.stdout.read(65536):
+                    pass
+            except Exception:
+                consumer_error = sys.exc_info()
+            finally:
+                process.stdout.close()
+                process.wait()
+        finally:
+            self._slots.release()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+        if consumer_error is not None:
+            raise consumer_error[0], consumer_error[1], consumer_error[2]
+        return result
+
+    def run_many(self, commands):
+        """
+        Runs a list of commands concurrently, and returns a list of (returncode, output) tuples in the same order as
+        the commands.  The exit status of each command is returned rather than raised.
+        """
+        results = [None] * len(commands)
+        running = collections.deque()
+        for i, command in enumerate(commands):
+            # Only block waiting for a free slot when none of our own commands are running, otherwise collect our
+            # oldest command to free its slot.
+            while not self._slots.acquire(len(running) == 0):
+                j, process = running.popleft()
+                results[j] = self._finish(process)
+            running.append((i, self._start(command)))
+        while running:
+            j, process = running.popleft()
+            results[j] = self._finish(process)
+        return results
+
+
+class AccountingTailer(object):
+    """
+    Follows a scheduler's accounting file, such as the SGE accounting file or OpenLava's lsb.acct, and returns the
+    finished tasks recorded in it since it was last read.  Reading starts from the end of the file as it was when the
+    tailer was created, and continues from the saved offset each time, so each read costs only the records added in
+    the meantime.  A record that is still being written is left until the next read.  If the file is replaced or
+    truncated, as when it is rotated, it is read again from the start.
+
+    parse_record is called with each record, one line of the file, and must return a tuple of
+    (job_id, array_index, state), or None if the record does not describe a finished task.
+    """
+
+    def __init__(self, path, parse_record, from_start=False):
+        self.path = path
+        self.parse_record = parse_record
+        self.offset = 0
+        self._inode = None
+        if not from_start:
+            try:
+                stat = os.stat(path)
+                self.offset = stat.st_size
+                self._inode = stat.st_ino
+            except OSError:
+                # The file may not exist until the first job finishes.
+                pass
+
+    def read(self):
+        """
+        Returns a list of (job_id, array_index, state) tuples for every finished task recorded since the last read.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            logging.warning("Unable to read accounting file: %s" % e)
+            return []
+        if stat.st_ino != self._inode or stat.st_size < self.offset:
+            logging.debug("Accounting file %s has been replaced, reading from the start" % self.path)
+            self._inode = stat.st_ino
+            self.offset = 0
+        if stat.st_size == self.offset:
+            return []
+
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    # Partially written record
+                    break
+                self.offset += len(line)
+                try:
+                    record = self.parse_record(line)
+                except (ValueError, IndexError):
+                    logging.warning("Unable to parse accounting record: %s" % line.strip())
+                    continue
+                if record is not None:
+                    records.append(record)
+        logging.debug("Read %d records from accounting file %s" % (len(records), self.path))
+        return records
+
+
+class SubmitQueue(object):
+    """
+    Holds jobs that are waiting to be submitted, ordered by the earliest time they may start.  Jobs are added by
+    appending a dictionary containing a start_time and the job arguments, exactly as with a list, but only jobs that
+    are due are ever examined when removing them.
+
+    .. py:method:: append(job_data)
+
+        Adds a job to the queue.
+
+    .. py:method:: pop_due(now)
+
+        Removes and returns, in start time order, all jobs whose start time is on or before now.
+
+    .. py:method:: peek_next_start_time()
+
+        Returns the start time of the next job due, or None if the queue is empty.
+
+    """
+
+    def __init__(self):
+        self._heap = []
+        # Breaks ties between jobs with the same start time, keeping them in the order they were added.
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        return (entry[2] for entry in self._heap)
+
+    def append(self, job_data):
+        heapq.heappush(self._heap, (job_data['start_time'], next(self._counter), job_data))
+
+    def extend(self, jobs):
+        for job_data in jobs:
+            self.append(job_data)
+
+    def peek_next_start_time(self):
+        if len(self._heap) < 1:
+            return None
+        return self._heap[0][0]
+
+    def pop_due(self, now):
+        jobs = []
+        while len(self._heap) > 0 and self._heap[0][0] <= now:
+            jobs.append(heapq.heappop(self._heap)[2])
+        return jobs
+
+
+class SubmissionPool(object):
+    """
+    Submits jobs to the scheduler from a pool of worker threads, so that a large batch of jobs that become due at the
+    same time reach the scheduler together rather than one after another.  No more than concurrency submissions are
+    in flight at any time.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self._pool = ThreadPool(concurrency)
+
+    @staticmethod
+    def _start_job(manager, job):
+        kwargs = dict(job)
+        num_tasks = kwargs.pop('num_tasks', 1)
+        start = time.time()
+        try:
+            return job, manager.start_job(num_tasks, **kwargs), time.time() - start, None
+        except Exception as e:
+            return job, None, time.time() - start, e
+
+    def start_jobs(self, manager, jobs, job_started):
+        """
+        Submits each job using manager.start_job(), where each job is a dictionary of arguments as found in the submit
+        queue.  As each submission finishes, job_started(job, tasks, seconds) is called on the calling thread, where
+        tasks is the TaskRange returned by start_job(), and seconds is the time start_job() took.  If any submission
+        fails, the first error is raised once every other job has been submitted and recorded, so that no submitted job
+        is left untracked.
+        """
+        error = None
+        for job, tasks, seconds, e in self._pool.imap_unordered(functools.partial(self._start_job, manager), jobs):
+            if e is not None:
+                logging.error("Unable to submit job: %s" % e)
+                error = error or e
+                continue
+            job_started(job, tasks, seconds)
+        if error is not None:
+            raise error
+
+
+class LatencyRecorder(object):
+    """
+    Collects the lifecycle latencies of finished tasks, grouped by the queue and project the job was submitted to.  The
+    queue wait of a task is the time from submission until it was first seen running, and the turnaround is the time
+    from submission until it was first seen to have finished.  Tasks are only observed when their status is polled, so
+    both are accurate to within the poll interval.  Tasks that finished without ever being seen running have no queue
+    wait.
+    """
+    percentiles = (50, 95, 99)
+
+    def __init__(self):
+        # {(queue_name, project_name): (queue waits, turnarounds)}, in seconds
+        self._groups = {}
+
+    def record(self, task_range, array_index):
+        """
+        Records the latencies of a task that has reached a terminal state.
+        """
+        pending_time, running_time, end_time = task_range.get_times(array_index)
+        key = (task_range.queue_name or "default", task_range.project_name or "default")
+        group = self._groups.get(key, None)
+        if group is None:
+            group = self._groups[key] = (array.array('d'), array.array('d'))
+        if running_time is not None:
+            group[0].append(running_time)
+        if end_time is not None:
+            group[1].append(end_time)
+
+    @classmethod
+    def summarize(cls, values):
+        """
+        Returns a dictionary with the count, mean, maximum and percentiles of a list of values in seconds, and a
+        histogram of how many values fall into each power of two bucket, as a list of [upper bound, count].
+        """
+        values = sorted(values)
+        summary = {'count': len(values)}
+        if len(values) == 0:
+            return summary
+        summary['mean'] = sum(values) / len(values)
+        summary['max'] = values[-1]
+        for p in cls.percentiles:
+            # Nearest rank
+            summary['p%d' % p] = values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+        histogram = []
+        bound = 1
+        for value in values:
+            while value > bound:
+                bound *= 2
+            if len(histogram) > 0 and histogram[-1][0] == bound:
+                histogram[-1][1] += 1
+            else:
+                histogram.append([bound, 1])
+        summary['histogram'] = histogram
+        return summary
+
+    def report(self):
+        """
+        Returns a list of dictionaries, one for each queue and project, containing the summaries of the queue waits and
+        turnarounds of their tasks.
+        """
+        return [
+            {
+                'queue': queue_name,
+                'project': project_name,
+                'queue_wait': self.summarize(waits),
+                'turnaround': self.summarize(turnarounds),
+            } for (queue_name, project_name), (waits, turnarounds) in sorted(self._groups.items())
+        ]
+
+    def log_report(self):
+        """
+        Logs the percentiles of the queue waits and turnarounds of each queue and project.
+        """
+        for entry in self.report():
+            for name in ('queue_wait', 'turnaround'):
+                summary = entry[name]
+                if summary['count'] == 0:
+                    continue
+                logging.info("Latency: queue %s, project %s, %s of %d tasks: p50 %.1fs, p95 %.1fs, p99 %.1fs, "
+                             "max %.1fs." % (entry['queue'], entry['project'], name.replace("_", " "),
+                                             summary['count'], summary['p50'], summary['p95'], summary['p99'],
+                                             summary['max']))
+
+    def write_report(self, path):
+        """
+        Writes the report to path as JSON.
+        """
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=4)
+
+
+class MetricsRecorder(object):
+    """
+    Records a sample of the job and task counters of one or more profiles once per poll cycle, along with the submit
+    queue depth, how long the poll took, and the latency of the submissions made since the previous sample.  Samples
+    are kept in a ring buffer of the most recent capacity samples, and are appended to a CSV or JSON lines file if a
+    path is given, every few samples and when flush() is called.  The latest sample can also be served in the
+    Prometheus text format.
+    """
+    fields = ("time", "submitted_jobs", "total_tasks", "pending_tasks", "running_tasks", "unknown_tasks",
+              "completed_tasks", "failed_tasks", "killed_tasks", "submit_queue_depth", "poll_seconds", "submissions",
+              "submit_latency_mean", "submit_latency_max")
+    formats = ("csv", "jsonl")
+    # Number of samples recorded between writes to the file.
+    flush_interval = 10
+
+    def __init__(self, capacity=1000, path=None, file_format="csv"):
+        if file_format not in self.formats:
+            raise ValueError("Unknown metrics format: %s" % file_format)
+        self.samples = collections.deque(maxlen=capacity)
+        self.path = path
+        self.file_format = file_format
+        self._unflushed = 0
+        self._submissions = 0
+        self._submit_seconds = 0.0
+        self._submit_max = 0.0
+        self._server = None
+
+    def record_submit(self, seconds):
+        """
+        Records the time taken to submit a single job.
+        """
+        self._submissions += 1
+        self._submit_seconds += seconds
+        self._submit_max = max(self._submit_max, seconds)
+
+    def sample(self, timestamp, profiles, poll_seconds):
+        """
+        Records a sample of the counters of profiles, summed if there is more than one, and returns it as a tuple in
+        the order of fields.
+        """
+        submit_latency_mean = 0.0
+        if self._submissions > 0:
+            submit_latency_mean = self._submit_seconds / self._submissions
+        row = (
+            timestamp.isoformat(),
+            sum(p.total_submitted_jobs for p in profiles),
+            sum(p.total_task_count for p in profiles),
+            sum(p.pending_task_count for p in profiles),
+            sum(p.running_task_count for p in profiles),
+            sum(p.unknown_task_count for p in profiles),
+            sum(p.completed_task_count for p in profiles),
+            sum(p.failed_task_count for p in profiles),
+            sum(p.killed_task_count for p in profiles),
+            sum(len(p.submit_queue) for p in profiles),
+            poll_seconds,
+            self._submissions,
+            submit_latency_mean,
+            self._submit_max,
+        )
+        self._submissions = 0
+        self._submit_seconds = 0.0
+        self._submit_max = 0.0
+
+        self.samples.append(row)
+        if self._unflushed == self.samples.maxlen:
+            logging.warning("Metrics buffer is full, the oldest sample was discarded before it was written.")
+        else:
+            self._unflushed += 1
+        if self.path and self._unflushed >= self.flush_interval:
+            self.flush()
+        return row
+
+    def flush(self):
+        """
+        Appends every sample recorded since the last flush to the metrics file, writing a header first if the file
+        is new and in CSV format.
+        """
+        if not self.path or self._unflushed == 0:
+            return
+        rows = list(self.samples)[-self._unflushed:]
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "ab") as f:
+            if self.file_format == "csv":
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(self.fields)
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    f.write(json.dumps(dict(zip(self.fields, row))) + "\n")
+        self._unflushed = 0
+
+    def render_prometheus(self):
+        """
+        Returns the latest sample in the Prometheus text exposition format.
+        """
+        if len(self.samples) == 0:
+            return ""
+        s = dict(zip(self.fields, self.samples[-1]))
+        lines = [
+            "# HELP lavastorm_submitted_jobs_total Jobs submitted to the scheduler.",
+            "# TYPE lavastorm_submitted_jobs_total counter",
+            "lavastorm_submitted_jobs_total %d" % s['submitted_jobs'],
+            "# HELP lavastorm_submitted_tasks_total Tasks submitted to the scheduler.",
+            "# TYPE lavastorm_submitted_tasks_total counter",
+            "lavastorm_submitted_tasks_total %d" % s['total_tasks'],
+            "# HELP lavastorm_active_tasks Tasks on the scheduler that have not finished, by state.",
+            "# TYPE lavastorm_active_tasks gauge",
+        ]
+        for state in ("pending", "running", "unknown"):
+            lines.append('lavastorm_active_tasks{state="%s"} %d' % (state, s['%s_tasks' % state]))
+        lines.extend([
+            "# HELP lavastorm_finished_tasks_total Tasks that have finished, by state.",
+            "# TYPE lavastorm_finished_tasks_total counter",
+        ])
+        for state in ("completed", "failed", "killed"):
+            lines.append('lavastorm_finished_tasks_total{state="%s"} %d' % (state, s['%s_tasks' % state]))
+        lines.extend([
+            "# HELP lavastorm_submit_queue_depth Jobs waiting to be submitted.",
+            "# TYPE lavastorm_submit_queue_depth gauge",
+            "lavastorm_submit_queue_depth %d" % s['submit_queue_depth'],
+            "# HELP lavastorm_poll_duration_seconds Time taken by the last poll cycle.",
+            "# TYPE lavastorm_poll_duration_seconds gauge",
+            "lavastorm_poll_duration_seconds %f" % s['poll_seconds'],
+            "# HELP lavastorm_submit_latency_seconds Time taken to submit a job, over the last poll cycle.",
+            "# TYPE lavastorm_submit_latency_seconds gauge",
+            'lavastorm_submit_latency_seconds{stat="mean"} %f' % s['submit_latency_mean'],
+            'lavastorm_submit_latency_seconds{stat="max"} %f' % s['submit_latency_max'],
+        ])
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port):
+        """
+        Serves the latest sample at http://<host>:port/metrics from a background thread.
+        """
+        self._server = BaseHTTPServer.HTTPServer(("", port), _PrometheusHandler)
+        self._server.recorder = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        logging.info("Serving metrics on port %d" % self._server.server_port)
+
+
+class _PrometheusHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.recorder.render_prometheus()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", "%d" % len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
 class Profile(object):
     sub_command_name = "Not Defined"
     sub_command_help = "Not Defined"
 
     def __init__(self):
         self.manager = None
-        self.submit_queue = []
+        self.submit_queue = SubmitQueue()
         self.active_jobs = []
+        # Set by profiles that have done everything they were asked to, run then returns.
+        self.finished = False
 
         self.total_submitted_jobs = 0
         self.total_active_jobs = 0
@@ -291,6 +1307,7 @@ class Profile(object):
         self.total_task_count = 0
         self.pending_task_count = 0
         self.running_task_count = 0
+        self.unknown_task_count = 0
         self.killed_task_count = 0
         self.completed_task_count = 0
         self.failed_task_count = 0
@@ -314,6 +1331,15 @@ class Profile(object):
         self.min_tasks_per_job = 1
         self.max_tasks_per_job = 1
 
+        self.poll_interval = 10  # seconds
+        self.submit_pool = None
+        self.next_poll_time = None
+        self.duration = 0  # seconds, zero to run until interrupted
+        self.clock = Clock()
+        self.metrics = None
+        self.latency = LatencyRecorder()
+        self.latency_report = None
+
     @classmethod
     def add_arguments(cls, sub_parser):
         """
@@ -338,7 +1364,7 @@ class Profile(object):
             return True
 
         for h in self.office_hours:
-            if h['start_time'] <= datetime.datetime.now().time() <= h['end_time']:
+            if h['start_time'] <= self.clock.now().time() <= h['end_time']:
                 return True
         return False
 
@@ -376,9 +1402,44 @@ class Profile(object):
         """
 
         logging.debug("Starting Job: %s" % kwargs)
+        start = time.time()
+        tasks = self.manager.start_job(num_tasks, **kwargs)
+        self.job_started(num_tasks, tasks, time.time() - start, kwargs.get('queue_name'), kwargs.get('project_name'))
+
+    def job_submitted(self, job, tasks, submit_seconds):
+        """
+        Called by the submit_pool when a job from the submit queue has been submitted, records it using
+        job_started().
+
+        :param job: Dictionary of arguments the job was submitted with
+        :param tasks: TaskRange returned by the job manager
+        :param submit_seconds: Time taken to submit the job
+
+        :return: None
+
+        """
+        self.job_started(job.get('num_tasks', 1), tasks, submit_seconds, job.get('queue_name'), job.get('project_name'))
+
+    def job_started(self, num_tasks, tasks, submit_seconds=None, queue_name=None, project_name=None):
+        """
+        Records a job that has been submitted to the scheduler.
+
+        :param num_tasks: Number of tasks contained by job
+        :param tasks: TaskRange returned by the job manager when the job was submitted
+        :param submit_seconds: Time taken to submit the job, recorded in the metrics if set
+        :param queue_name: Queue the job was submitted to
+        :param project_name: Project the job was submitted to
 
-        self.active_jobs.extend(self.manager.start_job(num_tasks, **kwargs))
-        logging.debug("Current active job list is: %s" % len(self.active_jobs))
+        :return: None
+
+        """
+        if self.metrics is not None and submit_seconds is not None:
+            self.metrics.record_submit(submit_seconds)
+        tasks.submit_time = self.clock.now()
+        tasks.queue_name = queue_name
+        tasks.project_name = project_name
+        self.active_jobs.append(tasks)
+        logging.debug("Current active job count is: %s" % len(self.active_jobs))
         self.pending_task_count += num_tasks
         self.total_task_count += num_tasks
         self.total_submitted_jobs += 1
@@ -405,6 +1466,17 @@ class Profile(object):
         """
         return self.manager.get_jobs(job_id)
 
+    def get_task_states(self, job_id):
+        """
+        Gets the state of every task for specified job id
+
+        :param job_id: Id of job
+        :return: list of (array_index, state) tuples
+        :rtype: list
+
+        """
+        return self.manager.get_task_states(job_id)
+
     def get_num_tasks(self):
         """
         Gets the number of tasks for the job.
@@ -416,20 +1488,13 @@ class Profile(object):
 
     def kill_all_jobs(self):
         """
-        Finds all jobs that are active, and tells the scheduler to kill them.
+        Tells the scheduler to kill every task that is active, with as few requests as the job manager allows.
 
         :return: None
 
         """
-        for jinf in self.active_jobs:
-            job = self.get_job(jinf['job_id'], jinf['array_index'])
-            if job.is_running or job.is_pending:
-                logging.debug("Job: %s:%s is active, killing..." % (job.job_id, job.array_index))
-                try:
-                    # Allow this to fail, job might have finished, etc...
-                    job.kill()
-                except:
-                    pass
+        logging.debug("Killing %d active jobs." % len(self.active_jobs))
+        self.manager.kill_jobs(self.active_jobs)
 
     def get_num_processors(self):
         """
@@ -468,7 +1533,7 @@ class Profile(object):
         :return: datetime object when job should start
 
         """
-        return datetime.datetime.now() + self.get_observation_time()
+        return self.clock.now() + self.get_observation_time()
 
     def create_job_command(self):
         """
@@ -487,57 +1552,43 @@ class Profile(object):
 
     def process_running_jobs(self):
         """
-        Scans all job ids associated with this profile, and moves them into the associated list for
-        pending, running, complete, killed, and failed jobs.
+        Checks the state of every task that is still active, records it in the task's TaskRange, and updates the
+        pending and running task counts.  Tasks that have reached a terminal state, completed, failed, or killed, are
+        added to the associated count and are never checked again.  Jobs with no active tasks left are removed from
+        active_jobs, so only jobs with at least one active task are requested from the scheduler.
 
         :return: None
 
         """
         logging.debug("Processing Jobs....")
 
-        # Set of job ids that need to be downloaded and checked
-        active_job_ids = set()
-        # job ids that were checked and found to be active
-        ajids_for_total = set()
-        # tasks that are active
-        active_jobs = []
-        # totals
-        self.pending_task_count = 0
-        self.pending_task_count = 0
-        self.running_task_count = 0
-        self.killed_task_count = 0
-        self.completed_task_count = 0
+        self.manager.prefetch_jobs([task_range.job_id for task_range in self.active_jobs])
 
-        for j in self.active_jobs:
-            active_job_ids.add(j['job_id'])
-
-        for jid in active_job_ids:
-            for job in self.get_jobs(jid):
-                logging.debug("Checking job: %d[%d]." % (job.job_id, job.array_index))
-                if job.is_running or job.is_suspended:
-                    ajids_for_total.add(job.job_id)
-                    logging.debug("Job %d is Running" % job.job_id)
-                    self.running_task_count += 1
-                    active_jobs.append(j)
-                elif job.is_pending:
-                    ajids_for_total.add(job.job_id)
-                    logging.debug("Job %d is Pending" % job.job_id)
-                    active_jobs.append(j)
-                    self.pending_task_count += 1
-                elif job.is_completed:
-                    self.completed_task_count += 1
-                    logging.debug("Job %d is Completed" % job.job_id)
-                elif job.is_failed:
-                    self.failed_task_count += 1
-                    logging.debug("Job %d is Failed" % job.job_id)
-                elif job.was_killed:
-                    self.killed_task_count += 1
-                    logging.debug("Job %d was Killed" % job.job_id)
-                else:
-                    logging.debug("Job %d is broken... %s" % (job.job_id, job))
-                    raise ValueError("This shouldn't happen")
-        self.total_active_jobs = len(ajids_for_total) + len(self.submit_queue)
-        self.total_finished_jobs = self.total_submitted_jobs - self.total_active_jobs
+        now = self.clock.now()
+        # Number of tasks found in each state during this cycle
+        counts = [0] * len(JOB_STATE_NAMES)
+        for task_range in self.active_jobs:
+            for array_index, state in self.get_task_states(task_range.job_id):
+                if array_index not in task_range:
+                    # Task finished in an earlier cycle.
+                    continue
+                logging.debug("Job %d[%d] is %s", task_range.job_id, array_index, JOB_STATE_NAMES[state])
+                counts[state] += 1
+                task_range.set_state(array_index, state, now)
+                if state >= JOB_COMPLETED:
+                    self.latency.record(task_range, array_index)
+
+        self.pending_task_count = counts[JOB_PENDING]
+        self.running_task_count = counts[JOB_RUNNING] + counts[JOB_SUSPENDED]
+        self.unknown_task_count = counts[JOB_UNKNOWN]
+        self.completed_task_count += counts[JOB_COMPLETED]
+        self.failed_task_count += counts[JOB_FAILED]
+        self.killed_task_count += counts[JOB_KILLED]
+
+        # Tasks the scheduler did not report on remain active until it does.
+        self.active_jobs = [task_range for task_range in self.active_jobs if len(task_range) > 0]
+        self.total_active_jobs = len(self.active_jobs) + len(self.submit_queue)
+        self.total_finished_jobs = self.total_submitted_jobs - len(self.active_jobs)
 
         logging.info("Job Activity: %d jobs total, %d jobs waiting to submit, %d jobs active, %d jobs finished. " %
                      (
@@ -547,11 +1598,12 @@ class Profile(object):
                          self.total_finished_jobs,
                      ))
         logging.info(
-            "Task Activity: %d total, %d pending, %d running, %d killed, %d complete, %d failed." %
+            "Task Activity: %d total, %d pending, %d running, %d unknown, %d killed, %d complete, %d failed." %
             (
                 self.total_task_count,
                 self.pending_task_count,
                 self.running_task_count,
+                self.unknown_task_count,
                 self.killed_task_count,
                 self.completed_task_count,
                 self.failed_task_count
@@ -561,43 +1613,141 @@ class Profile(object):
     def create_jobs(self):
         raise NotImplementedError
 
+    def get_next_office_hours_change(self):
+        """
+        Returns the next time after now at which the profile enters or leaves its office hours, or None if there are
+        no office hours defined.
+
+        :return: datetime object of the next change, or None
+
+        """
+        if len(self.office_hours) < 1:
+            return None
+
+        now = self.clock.now()
+        changes = []
+        for day in [now.date(), now.date() + datetime.timedelta(days=1)]:
+            for h in self.office_hours:
+                changes.append(datetime.datetime.combine(day, h['start_time']))
+                # The end time is inclusive, the profile leaves the office one second later.
+                changes.append(datetime.datetime.combine(day, h['end_time']) + datetime.timedelta(seconds=1))
+        return min(c for c in changes if c > now)
+
+    def get_next_poll_time(self):
+        """
+        Returns the time the status of running jobs should next be checked.  This is poll_interval seconds from now,
+        or the next office hours change if that is sooner, so new jobs are created as soon as the profile is active.
+
+        :return: datetime object of the next poll
+
+        """
+        next_poll = self.clock.now() + datetime.timedelta(seconds=self.poll_interval)
+        next_change = self.get_next_office_hours_change()
+        if next_change and next_change < next_poll:
+            return next_change
+        return next_poll
+
+    def get_next_wakeup_time(self):
+        """
+        Returns the time at which there is next something to do, which is the earliest of the next poll, and the start
+        time of the next job in the submit queue.
+
+        :return: datetime object of the next wakeup
+
+        """
+        wakeup = self.next_poll_time
+        next_start_time = self.submit_queue.peek_next_start_time()
+        if next_start_time is not None and next_start_time < wakeup:
+            wakeup = next_start_time
+        return wakeup
+
+    def is_poll_due(self):
+        """
+        Returns true if the status of running jobs should be checked now.
+
+        :return: True if a poll is due
+
+        """
+        return self.next_poll_time is None or self.clock.now() >= self.next_poll_time
+
+    def poll(self):
+        """
+        Updates the status of running jobs, then if the profile is active creates new jobs as required.
+
+        :return: None
+
+        """
+        self.process_running_jobs()
+        if self.is_active():
+            self.create_jobs()
+        self.next_poll_time = self.get_next_poll_time()
+
     def run(self):
         """
-        Called by the main loop periodically, manage jobs should create, start, stop, and kill processes as required.
+        Called by the main loop, manage jobs should create, start, stop, and kill processes as required.  Rather than
+        waking at a fixed interval, sleeps until the next poll is due or the next job in the submit queue is ready to
+        start.  Runs until interrupted, until the profile has finished, or until duration seconds have passed if a
+        duration is set, then kills all active jobs.
 
         :return: None
 
         """
+        end_time = None
+        if self.duration:
+            end_time = self.clock.now() + datetime.timedelta(seconds=self.duration)
         try:
-            while True:
-                self.process_running_jobs()
-                if self.is_active():
-                    self.create_jobs()
+            while end_time is None or self.clock.now() < end_time:
+                if self.is_poll_due():
+                    poll_start = time.time()
+                    self.manager.begin_poll_cycle()
+                    self.poll()
+                    if self.metrics is not None:
+                        self.metrics.sample(self.clock.now(), [self], time.time() - poll_start)
+                if self.finished:
+                    break
                 self.start_jobs()
-                time.sleep(10)
+                wakeup = self.get_next_wakeup_time()
+                if end_time is not None and end_time < wakeup:
+                    wakeup = end_time
+                self.clock.sleep_until(wakeup)
+            else:
+                logging.info("Duration reached. Killing all active jobs.")
         except KeyboardInterrupt:
             logging.info("Terminating. Killing all active jobs.")
-            self.kill_all_jobs()
+        self.kill_all_jobs()
+        if self.metrics is not None:
+            self.metrics.flush()
+        self.report_latency()
+
+    def report_latency(self):
+        """
+        Logs the queue wait and turnaround percentiles of the tasks that finished during the run, and writes them to
+        latency_report if set.
+
+        :return: None
+
+        """
+        self.latency.log_report()
+        if self.latency_report:
+            self.latency.write_report(self.latency_report)
 
     def start_jobs(self):
         """
-        Iterates through the submit_queue, checks it the current time is on or after the earliest time to submit the
-        job.  If that is the case, then the job is submitted using start_job().  If it isnt, it is left in the queue.
+        Removes all jobs from the submit_queue whose earliest time to submit is on or before the current time, and
+        submits them using start_job(), or through the submit_pool if one is set.  Jobs that are not yet due are left in
+        the queue.
 
         :return: None
 
         """
-        jobs = []
-        jobs.extend(self.submit_queue)
-        logging.debug("Jobs to process: %s" % jobs)
-        self.submit_queue = []
-        for job in jobs:
-            if job['start_time'] <= datetime.datetime.now():
-                # Ready to be started
+        jobs = self.submit_queue.pop_due(self.clock.now())
+        logging.debug("Jobs to process: %d, jobs still waiting: %d" % (len(jobs), len(self.submit_queue)))
+        if self.submit_pool is None:
+            for job in jobs:
                 self.start_job(**job['job'])
-            else:
-                # Not ready, put back in the queue.
-                self.submit_queue.append(job)
+            return
+
+        self.submit_pool.start_jobs(self.manager, [job['job'] for job in jobs], self.job_submitted)
 
 
 class DirectSGEManager(JobManager):
@@ -612,12 +1762,62 @@ class DirectSGEManager(JobManager):
                             help="The path to the bsub command, additional arguments can also be passed")
         parser.add_argument("--qsub_pe_type", type=str, default="orte",
                             help="The parallel environment to use when launching parallel jobs")
+        parser.add_argument("--qacct_grace_period", type=int, default=30,
+                            help="Seconds to keep checking for a task that is in neither qstat nor qacct before "
+                                 "assuming it was killed")
+        parser.add_argument("--sge_accounting_file", type=str, default=None,
+                            help="Read finished jobs by following the SGE accounting file, instead of running qacct")
 
     def __init__(self):
         super(DirectSGEManager, self).__init__()
+        self.runner = CommandRunner()
         self.job_sizes = {}
+        # Snapshot of qstat for the current poll cycle, {(job_id, task_id): state}, None until first needed.
+        self._qstat_states = None
+        # States of finished tasks read from accounting, {(job_id, task_id): state}, these never change so are kept
+        # across poll cycles.
+        self._accounting = {}
+        # Job ids whose accounting has already been read during the current poll cycle.
+        self._accounted_job_ids = set()
+        # Time each task was first found in neither qstat nor accounting, {(job_id, task_id): datetime}
+        self._missing_since = {}
+        # Follows the accounting file when --sge_accounting_file is given, otherwise qacct is used.
+        self._tailer = None
 
-    def start_job(self, num_tasks, requested_slots=None, project_name=None, command=None, queue_name=None):
+    def initialize(self, parsed_args):
+        super(DirectSGEManager, self).initialize(parsed_args)
+        self.runner = CommandRunner(parsed_args.scheduler_concurrency)
+        if parsed_args.sge_accounting_file:
+            self._tailer = AccountingTailer(parsed_args.sge_accounting_file, self._parse_accounting_record)
+
+    def begin_poll_cycle(self):
+        self._qstat_states = None
+        self._accounted_job_ids = set()
+        if self._tailer is not None:
+            for job_id, array_index, state in self._tailer.read():
+                if job_id in self.job_sizes:
+                    self._accounting[(job_id, array_index)] = state
+
+    def prefetch_jobs(self, job_ids):
+        if self._tailer is not None:
+            # Accounting is already up to date from the accounting file.
+            return
+        # Read accounting, concurrently, for every job that has a task which is neither in qstat nor already known
+        # to have finished.
+        states = self._get_qstat_states()
+        missing_job_ids = []
+        for job_id in job_ids:
+            job_id = int(job_id)
+            if job_id in self._accounted_job_ids:
+                continue
+            for array_index in range(1, self.job_sizes.get(job_id, 0) + 1) or [0]:
+                key = (job_id, array_index)
+                if key not in states and key not in self._accounting:
+                    missing_job_ids.append(job_id)
+                    break
+        self._load_accounting(missing_job_ids)
+
+    def _build_submit_command(self, num_tasks, requested_slots=None, project_name=None, queue_name=None):
         job_command = self.args.qsub_command.split()
 
         if requested_slots:
@@ -637,128 +1837,244 @@ class DirectSGEManager(JobManager):
             job_command.append("-q")
             job_command.append(queue_name)
 
-        import tempfile
-        input_file = tempfile.TemporaryFile()
-        input_file.write(command)
-        input_file.seek(0)
+        return job_command
 
-        logging.debug("Submitting job: %s" % " ".join(job_command))
-        output = subprocess.check_output(job_command, stdin=input_file)
+    def _parse_submit_output(self, output, num_tasks):
         if num_tasks > 1:
             match = re.search(r'Your job-array (\d+).* has been submitted', output)
         else:
             match = re.search(r'Your job (\d+).* has been submitted', output)
 
-        job_id = match.group(1)
+        task_range = TaskRange.for_job(match.group(1), num_tasks)
+        self.job_sizes[task_range.job_id] = task_range.last_index
+        return task_range
 
-        if num_tasks > 1:
-            jobs = [{'job_id': job_id, 'array_index': a_id} for a_id in range(1, num_tasks+1)]
-            self.job_sizes[job_id] = num_tasks
-        else:
-            jobs = [{'job_id': job_id, 'array_index': 0}]
-            self.job_sizes[job_id] = 0
+    def start_job(self, num_tasks, requested_slots=None, project_name=None, command=None, queue_name=None):
+        job_command = self._build_submit_command(num_tasks, requested_slots, project_name, queue_name)
 
-        return jobs
+        input_file = tempfile.TemporaryFile()
+        input_file.write(command)
+        input_file.seek(0)
+
+        logging.debug("Submitting job: %s" % " ".join(job_command))
+        return self._parse_submit_output(self.runner.run(job_command, stdin=input_file), num_tasks)
 
     def get_jobs(self, job_id):
-        jobs = []
-        for i in range(1, self.job_sizes[job_id]+1):
-            jobs.append(self.get_job(job_id, i))
-        if len(jobs) == 0:
-            jobs.append(self.get_job(job_id, 0))
-        return jobs
+        job_id = int(job_id)
+        return [SGEDirectJob(job_id, array_index, state=state) for array_index, state in self.get_task_states(job_id)]
+
+    def get_task_states(self, job_id):
+        job_id = int(job_id)
+        return [(array_index, self._get_task_state(job_id, array_index))
+                for array_index in range(1, self.job_sizes[job_id] + 1) or [0]]
 
     @staticmethod
-    def _get_from_qhist(job_id, array_index):
+    def _expand_task_ids(tasks):
+        """
+        Expands a qstat task specification such as "4", "1-10:1" or "1,3-5:1" into a list of task ids.
+        """
+        task_ids = []
+        for part in tasks.split(","):
+            part, c, step = part.partition(":")
+            first, c, last = part.partition("-")
+            if not last:
+                last = first
+            task_ids.extend(range(int(first), int(last) + 1, int(step or 1)))
+        return task_ids
 
-        # Try to get job from accounting (ie, job is done)
-        try:
-            is_completed = False
-            is_failed = False
-            was_killed = False
-            cmd = ["qacct", "-j", "%s" % job_id, "-t", "%s" % array_index]
-            logging.debug("Looking for jobs with command: %s" % " ".join(cmd))
-            output = subprocess.check_output(cmd)
-            logging.debug("Output from qstat: %s" % output)
-            for line in output.splitlines():
-                components = line.split()
-                if components[0] == "exit_status":
-                    if int(components[1]) == 0:
-                        is_completed = True
-                    else:
-                        is_failed = True
-                if components[0] == "failed":
-                    if components[1] != 0:
-                        is_failed = True
-            return SGEDirectJob(job_id, array_index,
-                                is_completed=is_completed,
-                                is_failed=is_failed,
-                                was_killed=was_killed)
-        except subprocess.CalledProcessError:
-            return None
+    @classmethod
+    def _parse_qstat(cls, source):
+        """
+        Parses the XML output of qstat, read from the file like object source, into a dictionary of
+        {(job_id, task_id): state}.  Jobs that are not part of an array have a task id of zero.
 
-    @staticmethod
-    def _get_from_qstat(job_id, array_index):
-        try:
-            cmd = ["qstat", "-g", "d", "-xml"]
+        The XML is parsed as a stream, each job_list element is removed from the tree as soon as it has been read, so
+        memory use does not grow with the size of the output.
+        """
+        states = {}
+        parents = []
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                continue
+            parents.pop()
+            if element.tag != "job_list":
+                continue
+
+            job_id = int(element.findtext("JB_job_number"))
+            state = element.findtext("state")
+            tasks = element.findtext("tasks")
+            if tasks:
+                for task_id in cls._expand_task_ids(tasks):
+                    states[(job_id, task_id)] = state
+            else:
+                states[(job_id, 0)] = state
+            if len(parents) > 0:
+                parents[-1].remove(element)
+        return states
 
+    def _get_qstat_states(self):
+        """
+        Returns the qstat snapshot for the current poll cycle, running qstat only if no snapshot has been taken yet.
+        """
+        if self._qstat_states is None:
+            cmd = ["qstat", "-g", "d", "-xml"]
             logging.debug("Looking for jobs with command: %s" % " ".join(cmd))
-            output = subprocess.check_output(cmd)
-            logging.debug("Output from qstat: %s" % output)
-            xmldoc = minidom.parseString(output)
-            jobs = xmldoc.getElementsByTagName('job_list')
-            for j in jobs:
-                e_job_id = j.getElementsByTagName('JB_job_number')[0].firstChild.nodeValue
-                e_job_id=int(e_job_id)
-                logging.debug("Job id returned is: %s" % e_job_id)
-                if job_id != e_job_id:
-                    continue
-                if array_index != 0 and j.getElementsByTagName('tasks')[0].firstChild.nodeValue != array_index:
-                    continue
+            try:
+                self._qstat_states = self.runner.stream(cmd, self._parse_qstat)
+            except (subprocess.CalledProcessError, SyntaxError) as e:
+                # ElementTree.ParseError is a SyntaxError, raised if qstat exits cleanly with truncated output.
+                logging.warning("Unable to get job list from qstat: %s" % e)
+                self._qstat_states = {}
+            logging.debug("qstat snapshot contains %d tasks" % len(self._qstat_states))
+        return self._qstat_states
 
-                state = j.getElementsByTagName('state')[0].firstChild.nodeValue
-                if state == "qw":
-                    return SGEDirectJob(job_id, array_index, is_pending=True)
-                if state == "r":
-                    return SGEDirectJob(job_id, array_index, is_running=True)
+    @staticmethod
+    def _parse_qacct(output):
+        """
+        Parses the output of qacct -j, which may contain records for many tasks, into a dictionary of
+        {(job_id, task_id): state}.
+        """
+        states = {}
+        records = [{}]
+        for line in output.splitlines():
+            if line.startswith("====="):
+                records.append({})
+                continue
+            components = line.split(None, 1)
+            if len(components) == 2:
+                records[-1][components[0]] = components[1].strip()
+
+        for record in records:
+            if 'jobnumber' not in record:
+                continue
+            try:
+                array_index = int(record.get('taskid', 0))
+            except ValueError:
+                # Jobs that are not part of an array have a taskid of "undefined"
+                array_index = 0
+            failed = int(record.get('failed', "0").split()[0]) != 0
+            exit_status = int(record.get('exit_status', "0").split()[0])
+            if exit_status == 0 and not failed:
+                states[(int(record['jobnumber']), array_index)] = JOB_COMPLETED
+            else:
+                states[(int(record['jobnumber']), array_index)] = JOB_FAILED
+        return states
 
-        except subprocess.CalledProcessError:
+    def _load_accounting(self, job_ids):
+        """
+        Reads the accounting records of every finished task of each job, with one call to qacct per job.  The calls
+        for different jobs run concurrently.
+        """
+        self._accounted_job_ids.update(job_ids)
+        commands = [["qacct", "-j", "%s" % job_id] for job_id in job_ids]
+        for returncode, output in self.runner.run_many(commands):
+            if returncode != 0:
+                # Job has no accounting records yet.
+                continue
+            self._accounting.update(self._parse_qacct(output))
+
+    def _get_from_accounting(self, job_id, array_index):
+        key = (job_id, array_index)
+        if key not in self._accounting and job_id not in self._accounted_job_ids and self._tailer is None:
+            self._load_accounting([job_id])
+        return self._accounting.get(key, None)
+
+    @staticmethod
+    def _parse_accounting_record(line):
+        """
+        Parses a record of the SGE accounting file, in which fields are separated by colons, into a tuple of
+        (job_id, task_id, state).  Jobs that are not part of an array have a task id of zero.
+        """
+        if line.startswith("#"):
             return None
+        fields = line.rstrip("\n").split(":")
+        job_id = int(fields[5])
+        failed = int(fields[11])
+        exit_status = int(fields[12])
+        task_id = int(fields[35])
+        if exit_status == 0 and failed == 0:
+            return job_id, task_id, JOB_COMPLETED
+        return job_id, task_id, JOB_FAILED
 
-    def get_job(self, job_id, array_index):
-        job_id=int(job_id)
-        array_index=int(array_index)
+    @staticmethod
+    def _qstat_job_state(state):
+        if "s" in state or "S" in state or "T" in state:
+            return JOB_SUSPENDED
+        if "r" in state or "t" in state:
+            return JOB_RUNNING
+        return JOB_PENDING
+
+    def _get_task_state(self, job_id, array_index):
+        state = self._accounting.get((job_id, array_index), None)
+        if state is not None:
+            # Already in a final state, so it can not be pending, running, or in the grace period again.
+            self._missing_since.pop((job_id, array_index), None)
+            return state
+
+        state = self._get_qstat_states().get((job_id, array_index), None)
+        if state is not None:
+            self._missing_since.pop((job_id, array_index), None)
+            return self._qstat_job_state(state)
+
+        state = self._get_from_accounting(job_id, array_index)
+        if state is not None:
+            self._missing_since.pop((job_id, array_index), None)
+            return state
+
+        # Not in qstat, and not yet in accounting, which happens for a short while after a task ends.  The task is
+        # unknown until either accounting catches up on a later poll cycle, or the grace period runs out.
+        now = self.clock.now()
+        missing_since = self._missing_since.setdefault((job_id, array_index), now)
+        if now - missing_since < datetime.timedelta(seconds=self.args.qacct_grace_period):
+            return JOB_UNKNOWN
+
+        logging.warning("Job %s[%s] is in neither qstat nor qacct, assuming it was killed." % (job_id, array_index))
+        del self._missing_since[(job_id, array_index)]
+        # Recorded with the accounting, so that while the rest of the array is active, later cycles neither run qacct
+        # for the task again nor repeat the warning.
+        self._accounting[(job_id, array_index)] = JOB_KILLED
+        return JOB_KILLED
 
+    def get_job(self, job_id, array_index):
         if array_index is None:
             array_index = 0
 
-        job = self._get_from_qhist(job_id, array_index)
-        if job:
-            return job
-
-        job = self._get_from_qstat(job_id, array_index)
-        if job:
-            return job
-
-        # not in qstat, but not in qhist, try for 10 more seconds to get the job.
-        for i in range(30):
-            job = self._get_from_qhist(job_id, array_index)
-            if job:
-                return job
-            time.sleep(1)
-
-        return SGEDirectJob(job_id, array_index, was_killed=True, is_failed=True)
+        job_id = int(job_id)
+        array_index = int(array_index)
+        return SGEDirectJob(job_id, array_index, state=self._get_task_state(job_id, array_index))
+
+    def kill_jobs(self, task_ranges):
+        # Jobs with every task still active are killed whole, many jobs to each qdel.  Jobs with some tasks already
+        # finished are killed with one qdel per run of active tasks.
+        whole_jobs = []
+        commands = []
+        for task_range in task_ranges:
+            if len(task_range) == 0:
+                continue
+            if len(task_range) == task_range.num_tasks:
+                whole_jobs.append("%d" % task_range.job_id)
+                continue
+            for first, last in task_range.runs():
+                commands.append(["qdel", "%d" % task_range.job_id, "-t", "%d-%d" % (first, last)])
+        for i in range(0, len(whole_jobs), KILL_BATCH_SIZE):
+            commands.append(["qdel"] + whole_jobs[i:i + KILL_BATCH_SIZE])
+
+        for command, (returncode, output) in zip(commands, self.runner.run_many(commands)):
+            if returncode != 0:
+                logging.warning("Unable to kill jobs with %s: %s" % (" ".join(command), output))
 
 
 class SGEDirectJob(SimpleJob):
     """
     SimpleJob Implementation for Sun Grid Engine
     """
+    __slots__ = ()
 
     def kill(self):
-        cmd = list("qdel")
+        cmd = ["qdel"]
         cmd.append("%s" % self.job_id)
-        if self.array_index is not 0:
+        if self.array_index != 0:
             cmd.append("-t")
             cmd.append("%s" % self.array_index)
         subprocess.check_output(cmd)
@@ -768,10 +2084,11 @@ class OpenLavaDirectJob(SimpleJob):
     """
     SimpleJob Implementation for Open Lava
     """
+    __slots__ = ()
 
     def kill(self):
         cmd = ["bkill"]
-        if self.array_index is not 0:
+        if self.array_index != 0:
             cmd.append("%s[%s]" % (self.job_id, self.array_index))
         else:
             cmd.append("%s" % self.job_id)
@@ -785,8 +2102,59 @@ class DirectOpenLavaManager(JobManager):
     def add_argparse_arguments(cls, parser):
         parser.add_argument("--bsub_command", type=str, default="bsub",
                             help="The path to the bsub command, additional arguments can also be passed")
+        parser.add_argument("--bjobs_user", type=str, default=None,
+                            help="The user whose jobs are listed by bjobs each poll cycle, defaults to the current "
+                                 "user")
+        parser.add_argument("--lsb_acct_file", type=str, default=None,
+                            help="Read finished jobs by following the OpenLava lsb.acct file, so bjobs only needs to "
+                                 "list unfinished jobs")
 
-    def start_job(self, num_tasks, requested_slots=None, project_name=None, command=None, queue_name=None):
+    def __init__(self):
+        super(DirectOpenLavaManager, self).__init__()
+        self.runner = CommandRunner()
+        # Snapshot of bjobs for the current poll cycle, {job_id: {array_index: state}}, None until first needed.
+        self._bjobs_states = None
+        # Job ids that were looked up individually during the current poll cycle.
+        self._queried_job_ids = set()
+        # Set when bjobs fails during the current poll cycle, jobs missing from its output are then unknown rather than
+        # killed.
+        self._bjobs_failed = False
+        # Follows lsb.acct when --lsb_acct_file is given.
+        self._tailer = None
+        # Job ids submitted by this manager, only these are taken from lsb.acct.
+        self._submitted_job_ids = set()
+        # The number of tasks of each array job submitted by this manager, {job_id: num_tasks}
+        self.job_sizes = {}
+        # Finished tasks read from lsb.acct, {job_id: {array_index: state}}, these never change so are kept across
+        # poll cycles.
+        self._finished_states = {}
+
+    def initialize(self, parsed_args):
+        super(DirectOpenLavaManager, self).initialize(parsed_args)
+        self.runner = CommandRunner(parsed_args.scheduler_concurrency)
+        if parsed_args.lsb_acct_file:
+            self._tailer = AccountingTailer(parsed_args.lsb_acct_file, self._parse_lsb_acct_record)
+
+    def begin_poll_cycle(self):
+        self._bjobs_states = None
+        self._queried_job_ids = set()
+        self._bjobs_failed = False
+        if self._tailer is not None:
+            for job_id, array_index, state in self._tailer.read():
+                if job_id in self._submitted_job_ids:
+                    self._finished_states.setdefault(job_id, {})[array_index] = state
+
+    def prefetch_jobs(self, job_ids):
+        # Jobs missing from the listing of the user's jobs are all queried with a single call to bjobs.
+        states = self._get_bjobs_states()
+        missing_job_ids = [int(j) for j in job_ids if int(j) not in states and int(j) not in self._queried_job_ids
+                           and int(j) not in self._finished_states]
+        if len(missing_job_ids) > 0:
+            self._queried_job_ids.update(missing_job_ids)
+            self._parse_bjobs(self._run_bjobs(["bjobs", "-w", "-a"] + ["%s" % j for j in missing_job_ids]), states)
+
+    def _build_submit_command(self, num_tasks, requested_slots=None, project_name=None, command=None,
+                              queue_name=None):
         job_command = self.args.bsub_command.split()
 
         if requested_slots:
@@ -807,132 +2175,178 @@ class DirectOpenLavaManager(JobManager):
             job_command.append(queue_name)
 
         job_command.append(command)
-        logging.debug("Submitting job: %s" % " ".join(job_command))
-        output = subprocess.check_output(job_command)
+        return job_command
+
+    @staticmethod
+    def _parse_submit_output(output):
         match = re.search(r'Job <(\d+)> is submitted to.*', output)
-        job_id = match.group(1)
-        jobs = [{'job_id': job_id, 'array_index': 0}]
+        return int(match.group(1))
 
-        if num_tasks > 1:
-            jobs = []
-            bjobs_command = ["bjobs", "-w", "-a", "%s" % job_id]
-            output = subprocess.check_output(bjobs_command)
-            for line in output.splitlines():
-                match = re.search(r'.*LavaStorm\[\d+\]', line)
-                array_id = match.group(1)
-                jobs.append({'job_id': job_id, 'array_index': array_id})
+    def start_job(self, num_tasks, requested_slots=None, project_name=None, command=None, queue_name=None):
+        job_command = self._build_submit_command(num_tasks, requested_slots, project_name, command, queue_name)
+        logging.debug("Submitting job: %s" % " ".join(job_command))
+        # Array jobs are named LavaStorm[1-N], so the array indexes are known without asking bjobs.
+        task_range = TaskRange.for_job(self._parse_submit_output(self.runner.run(job_command)), num_tasks)
+        self._submitted_job_ids.add(task_range.job_id)
+        self.job_sizes[task_range.job_id] = task_range.last_index
+        return task_range
 
-        return jobs
+    @staticmethod
+    def _parse_lsb_acct_record(line):
+        """
+        Parses a JOB_FINISH record of lsb.acct, in which fields are separated by spaces and strings are quoted, into a
+        tuple of (job_id, array_index, state).  Other records return None.
+        """
+        if not line.startswith('"JOB_FINISH"'):
+            return None
+        fields = shlex.split(line)
+        job_id = int(fields[3])
+        # The asked and execution host lists are preceded by their lengths.
+        i = 23 + int(fields[22])
+        i += 1 + int(fields[i])
+        status = int(fields[i])
+        # jStatus, hostFactor, jobName, command, 19 resource usage fields, mailUser, projectName, exitStatus,
+        # maxNumProcessors, loginShell, timeEvent, then the array index.
+        array_index = int(fields[i + 29])
+        if status & 0x40:
+            # JOB_STAT_DONE
+            return job_id, array_index, JOB_COMPLETED
+        return job_id, array_index, JOB_FAILED
 
-    def get_jobs(self, job_id):
-        bjobs_command = ["bjobs", "-w", "-a", "%s" % job_id]
-        logging.debug("Looking for jobs with command: %s" % " ".join(bjobs_command))
-        output = subprocess.check_output(bjobs_command)
-        logging.debug("Output from bjobs: %s" % output)
-        lines = output.splitlines()
-        jobs = []
-        lines.pop(0)
-        logging.debug("Lines: %s" % lines)
-        for line in lines:
-            if len(lines) > 1:
-                # get array index
-                match = re.search(r'.*LavaStorm\[\d+\]', line)
-                array_index = match.group(1)
+    @staticmethod
+    def _parse_bjobs(output, states):
+        """
+        Parses the output of bjobs -w, adding the state of each task to states as {job_id: {array_index: state}},
+        where state is the job state for the bjobs status in BJOBS_STATES.  Jobs that are not part of an array have an
+        array index of zero.
+        """
+        for line in output.splitlines():
+            entries = line.split()
+            if len(entries) < 3 or not entries[0].isdigit():
+                # Header, or a message such as "No unfinished job found"
+                continue
+            match = re.search(r'LavaStorm\[(\d+)\]', line)
+            if match:
+                array_index = int(match.group(1))
             else:
                 array_index = 0
-            jobs.append(self.get_job(job_id, array_index))
-        return jobs
+            states.setdefault(int(entries[0]), {})[array_index] = BJOBS_STATES[entries[2]]
 
-    def get_job(self, job_id, array_index):
-        if array_index != 0:
-            job = "%s[%s]" % (job_id, array_index)
-        else:
-            job = "%s" % job_id
+    @staticmethod
+    def _is_bjobs_failure(returncode, output, errors):
+        """
+        Returns True if bjobs failed to list jobs.  bjobs exits with an error when any requested job is unknown, or
+        when there are no jobs to list, so that is only a failure if no jobs were listed and the error was something
+        other than a job not being found, such as mbatchd being down.
+        """
+        if returncode == 0:
+            return False
+        if any(line.split() and line.split()[0].isdigit() for line in output.splitlines()):
+            return False
+        for line in errors.splitlines():
+            if line.strip() and not any(message in line for message in BJOBS_NOT_FOUND_MESSAGES):
+                return True
+        return False
 
-        bjobs_command = ["bjobs", "-w", "-a", job]
+    def _run_bjobs(self, bjobs_command):
+        """
+        Runs bjobs and returns its output.  If bjobs fails, a warning is logged and an empty output is returned, and
+        jobs missing from the output are reported as unknown for the rest of the poll cycle.
+        """
         logging.debug("Looking for jobs with command: %s" % " ".join(bjobs_command))
-        output = subprocess.check_output(bjobs_command)
+        returncode, output, errors = self.runner.run_unchecked(bjobs_command)
         logging.debug("Output from bjobs: %s" % output)
-        output = output.splitlines()
-        output.pop(0)
-        entries = output.pop(0).split()
-        state = entries[2]
-        states = {
-            "PEND": {
-                "is_running": False,
-                "is_pending": True,
-                "is_suspended": False,
-                "is_completed": False,
-                "is_failed": False,
-                "was_killed": False,
-            },
-            "PSUSP": {
-                "is_running": False,
-                "is_pending": False,
-                "is_suspended": True,
-                "is_completed": False,
-                "is_failed": False,
-                "was_killed": False,
-            },
-            "RUN": {
-                "is_running": True,
-                "is_pending": False,
-                "is_suspended": False,
-                "is_completed": False,
-                "is_failed": False,
-                "was_killed": False,
-            },
-            "USUSP": {
-                "is_running": False,
-                "is_pending": False,
-                "is_suspended": True,
-                "is_completed": False,
-                "is_failed": False,
-                "was_killed": False,
-            },
-            "SSUSP": {
-                "is_running": False,
-                "is_suspended": True,
-                "is_pending": False,
-                "is_completed": False,
-                "is_failed": False,
-                "was_killed": False,
-            },
-            "DONE": {
-                "is_running": False,
-                "is_pending": False,
-                "is_suspended": False,
-                "is_completed": True,
-                "is_failed": False,
-                "was_killed": False,
-            },
-            "EXIT": {
-                "is_running": False,
-                "is_pending": False,
-                "is_suspended": False,
-                "is_completed": False,
-                "is_failed": True,
-                "was_killed": False,
-            },
-            "UNKWN": {
-                "is_running": True,
-                "is_pending": False,
-                "is_suspended": False,
-                "is_completed": False,
-                "is_failed": False,
-                "was_killed": False,
-            },
-            "ZOMBI": {
-                "is_running": True,
-                "is_pending": False,
-                "is_suspended": False,
-                "is_completed": False,
-                "is_failed": False,
-                "was_killed": False,
-            },
-        }
+        if self._is_bjobs_failure(returncode, output, errors):
+            logging.warning("Unable to get job list from bjobs: %s" % errors.strip())
+            self._bjobs_failed = True
+            return ""
+        return output
+
+    def _get_bjobs_states(self):
+        """
+        Returns the bjobs snapshot for the current poll cycle, listing every job belonging to the user with a single
+        call to bjobs if no snapshot has been taken yet.  When finished jobs are read from lsb.acct, only unfinished
+        jobs are listed.
+        """
+        if self._bjobs_states is None:
+            user = self.args.bjobs_user or getpass.getuser()
+            self._bjobs_states = {}
+            if self._tailer is not None:
+                bjobs_command = ["bjobs", "-w", "-u", user]
+            else:
+                bjobs_command = ["bjobs", "-w", "-a", "-u", user]
+            self._parse_bjobs(self._run_bjobs(bjobs_command), self._bjobs_states)
+        return self._bjobs_states
+
+    def _get_job_states(self, job_id):
+        """
+        Returns {array_index: state} for all tasks of the job, taken from the snapshot for the current poll cycle,
+        and from lsb.acct for finished tasks.  Jobs missing from both, that were not already fetched by prefetch_jobs,
+        are queried individually.
+        """
+        self._get_bjobs_states()
+        finished = self._finished_states.get(job_id, None)
+        if job_id not in self._bjobs_states and job_id not in self._queried_job_ids and finished is None:
+            self._queried_job_ids.add(job_id)
+            self._parse_bjobs(self._run_bjobs(["bjobs", "-w", "-a", "%s" % job_id]), self._bjobs_states)
+        states = self._bjobs_states.get(job_id, {})
+        if finished is not None:
+            states = dict(states)
+            states.update(finished)
+        return states
+
+    def get_jobs(self, job_id):
+        job_id = int(job_id)
+        return [OpenLavaDirectJob(job_id, array_index, state=state)
+                for array_index, state in self.get_task_states(job_id)]
+
+    def get_task_states(self, job_id):
+        job_id = int(job_id)
+        states = self._get_job_states(job_id)
+        if len(states) == 0:
+            # The whole job has gone, its state is reported for every index, so that array jobs are retired too.
+            state = self._get_task_state(job_id, 0)
+            return [(array_index, state) for array_index in range(1, self.job_sizes.get(job_id, 0) + 1) or [0]]
+        return states.items()
+
+    def _get_task_state(self, job_id, array_index):
+        state = self._get_job_states(job_id).get(array_index, None)
+        if state is None and self._bjobs_failed:
+            # Missing because bjobs failed, not because the job has gone.
+            return JOB_UNKNOWN
+        if state is None:
+            logging.warning("Job %s[%s] is not known to bjobs, assuming it was killed." % (job_id, array_index))
+            return JOB_KILLED
+        return state
+
+    def get_job(self, job_id, array_index):
+        job_id = int(job_id)
+        array_index = int(array_index)
+        return OpenLavaDirectJob(job_id, array_index, state=self._get_task_state(job_id, array_index))
+
+    def kill_jobs(self, task_ranges):
+        # Many jobs are killed with each bkill, jobs with some tasks already finished are given as a list of the
+        # ranges of active tasks, e.g. 1234[1-5,8,10-20].
+        job_specs = []
+        for task_range in task_ranges:
+            if len(task_range) == 0:
+                continue
+            if len(task_range) == task_range.num_tasks:
+                job_specs.append("%d" % task_range.job_id)
+                continue
+            runs = []
+            for first, last in task_range.runs():
+                if first == last:
+                    runs.append("%d" % first)
+                else:
+                    runs.append("%d-%d" % (first, last))
+            job_specs.append("%d[%s]" % (task_range.job_id, ",".join(runs)))
+        commands = [["bkill"] + job_specs[i:i + KILL_BATCH_SIZE] for i in range(0, len(job_specs), KILL_BATCH_SIZE)]
 
-        return OpenLavaDirectJob(job_id, array_index, **states[state])
+        for command, (returncode, output) in zip(commands, self.runner.run_many(commands)):
+            if returncode != 0:
+                # bkill fails if any of the jobs has already finished, but still kills the others.
+                logging.warning("Unable to kill jobs with %s: %s" % (" ".join(command), output))
 
 
 class OpenLavaClusterAPIManager(JobManager):
@@ -945,9 +2359,7 @@ class OpenLavaClusterAPIManager(JobManager):
         for f in ['project_name', 'queue_name']:
             if f in kwargs and not kwargs[f]:
                 del (kwargs[f])
-        return [
-            {'job_id': j.job_id, 'array_index': j.array_index} for j in CJob.submit(**kwargs)
-        ]
+        return TaskRange.for_job(CJob.submit(**kwargs)[0].job_id, num_tasks)
 
     def get_jobs(self, job_id):
         return CJob.get_job_list(job_id, -1)
@@ -959,6 +2371,14 @@ class OpenLavaRemoteManager(JobManager):
     """
     Job Manager for the OpenLavaWeb server.  Uses REST calls to manage jobs.
 
+    Requests are made over a pool of logged in connections, which are kept for the life of the manager so that each
+    session is only established once.  At the start of each poll cycle the task lists of all active jobs are fetched
+    concurrently, one request per job over each connection in the pool, and get_job and get_jobs are answered from
+    those results.  olwclient can only list the tasks of a single job, or every job on the cluster, it has no query
+    for a set of job ids, so the lookups are run concurrently rather than batched into one request.  Status queries are
+    retried with an increasing delay, for up to web_retry_timeout seconds, if the server can not be reached;
+    submissions are not retried, as the server may have accepted the job before the failure.
+
     """
     scheduler_name = "openlava_web"
 
@@ -970,15 +2390,101 @@ class OpenLavaRemoteManager(JobManager):
                             help="The username of the account used when submitting jobs through openlava web.")
         parser.add_argument("--password", type=str, default=None,
                             help="The password of the account used when submitting jobs through openlava web.")
+        parser.add_argument("--web_connections", type=int, default=4,
+                            help="The number of connections to keep open to the openlava web server.")
+        parser.add_argument("--web_retries", type=int, default=3,
+                            help="The number of times a failed request to the openlava web server is retried.")
+        parser.add_argument("--web_retry_delay", type=float, default=1.0,
+                            help="Seconds to wait before the first retry, doubling for each further retry.")
+        parser.add_argument("--web_retry_timeout", type=float, default=30.0,
+                            help="The maximum number of seconds spent waiting between retries of one request.")
 
+    def __init__(self):
+        super(OpenLavaRemoteManager, self).__init__()
+        self.connection = None
+        self._connections = Queue.Queue()
+        self._num_connections = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        # Task lists fetched during the current poll cycle, {job_id: [Job]}
+        self._job_lists = {}
 
     def initialize(self, args):
+        super(OpenLavaRemoteManager, self).initialize(args)
         logging.debug("Initializing Job Manager for OpenLava Web Interface")
-        connection = OpenLavaConnection(args)
+        self._pool = ThreadPool(args.web_connections)
+        self.connection = self._connect()
+        self._num_connections = 1
+        self._connections.put(self.connection)
+        logging.debug("Initialized.")
+
+    def _connect(self):
+        connection = OpenLavaConnection(self.args)
         logging.debug("Logging in...")
         connection.login()
-        logging.debug("Initialized.")
-        self.connection = connection
+        return connection
+
+    def _acquire_connection(self):
+        """
+        Takes an idle connection from the pool, logging in a new one if all are busy and the pool is not yet full.
+        """
+        try:
+            return self._connections.get_nowait()
+        except Queue.Empty:
+            pass
+        with self._lock:
+            create = self._num_connections < self.args.web_connections
+            if create:
+                self._num_connections += 1
+        if create:
+            try:
+                return self._connect()
+            except:
+                with self._lock:
+                    self._num_connections -= 1
+                raise
+        return self._connections.get()
+
+    def _call(self, func, *args, **kwargs):
+        """
+        Calls func with a pooled connection as its first argument.  If the request fails with a network error, the
+        connection logs in again and the request is retried, up to web_retries times, or until web_retry_timeout
+        seconds have been spent waiting.
+        """
+        retries = kwargs.pop('retries', self.args.web_retries)
+        connection = self._acquire_connection()
+        try:
+            delay = self.args.web_retry_delay
+            give_up_time = time.time() + self.args.web_retry_timeout
+            for attempt in range(retries + 1):
+                try:
+                    return func(connection, *args, **kwargs)
+                except (IOError, httplib.HTTPException) as e:
+                    remaining = give_up_time - time.time()
+                    if attempt >= retries or remaining <= 0:
+                        raise
+                    delay = min(delay, remaining)
+                    logging.warning("Request to openlava web failed: %s, retrying in %s seconds." % (e, delay))
+                    time.sleep(delay)
+                    delay *= 2
+                    try:
+                        connection.login()
+                    except (IOError, httplib.HTTPException):
+                        pass
+        finally:
+            self._connections.put(connection)
+
+    def begin_poll_cycle(self):
+        self._job_lists = {}
+
+    def _fetch_job_list(self, job_id):
+        return job_id, self._call(Job.get_job_list, job_id, -1)
+
+    def prefetch_jobs(self, job_ids):
+        # One request per job, as olwclient can not query several job ids at once.
+        missing_job_ids = [j for j in job_ids if j not in self._job_lists]
+        for job_id, jobs in self._pool.imap_unordered(self._fetch_job_list, missing_job_ids):
+            self._job_lists[job_id] = jobs
 
     def start_job(self, num_tasks, **kwargs):
         if num_tasks > 1:
@@ -987,38 +2493,550 @@ class OpenLavaRemoteManager(JobManager):
         for f in ['project_name', 'queue_name']:
             if f in kwargs and not kwargs[f]:
                 del (kwargs[f])
-        return [
-            {'job_id': j.job_id, 'array_index': j.array_index} for j in Job.submit(self.connection, **kwargs)
-        ]
+        return TaskRange.for_job(self._call(Job.submit, retries=0, **kwargs)[0].job_id, num_tasks)
 
     def get_jobs(self, job_id):
-        return Job.get_job_list(self.connection, job_id, -1)
+        if job_id not in self._job_lists:
+            self._job_lists[job_id] = self._call(Job.get_job_list, job_id, -1)
+        return self._job_lists[job_id]
+
+    @staticmethod
+    def _kill_tasks(connection, task_range):
+        # The jobs keep a reference to the connection they were fetched with, so they are killed while it is still
+        # checked out of the pool.
+        for job in Job.get_job_list(connection, task_range.job_id, -1):
+            if job.array_index in task_range:
+                job.kill()
+
+    def _kill_task_range(self, task_range):
+        try:
+            self._call(self._kill_tasks, task_range)
+        except Exception as e:
+            return task_range, e
+        return task_range, None
+
+    def kill_jobs(self, task_ranges):
+        # Each job is killed on its own pooled connection, so jobs are killed concurrently.
+        for task_range, e in self._pool.imap_unordered(self._kill_task_range, list(task_ranges)):
+            if e is not None:
+                logging.warning("Unable to kill job %s: %s" % (task_range, e))
 
     def get_job(self, job_id, array_index):
-        return Job(self.connection, job_id, array_index)
+        for job in self._job_lists.get(job_id, []):
+            if job.array_index == array_index:
+                return job
+        return self._call(Job, job_id, array_index)
+
+
+class OpenLavaCAPIJob(SimpleJob):
+    """
+    SimpleJob Implementation for the OpenLava C API
+    """
+    __slots__ = ("manager",)
+
+    def __init__(self, manager, job_id, array_index, **kwargs):
+        super(OpenLavaCAPIJob, self).__init__(job_id, array_index, **kwargs)
+        self.manager = manager
+
+    def kill(self):
+        self.manager.kill_task(self.job_id, self.array_index)
+
+
+class _LsbSubmit(ctypes.Structure):
+    # struct submit from lsbatch.h
+    _fields_ = [
+        ("options", ctypes.c_int),
+        ("options2", ctypes.c_int),
+        ("jobName", ctypes.c_char_p),
+        ("queue", ctypes.c_char_p),
+        ("numAskedHosts", ctypes.c_int),
+        ("askedHosts", ctypes.POINTER(ctypes.c_char_p)),
+        ("resReq", ctypes.c_char_p),
+        ("rLimits", ctypes.c_int * 12),
+        ("hostSpec", ctypes.c_char_p),
+        ("numProcessors", ctypes.c_int),
+        ("dependCond", ctypes.c_char_p),
+        ("beginTime", ctypes.c_long),
+        ("termTime", ctypes.c_long),
+        ("sigValue", ctypes.c_int),
+        ("inFile", ctypes.c_char_p),
+        ("outFile", ctypes.c_char_p),
+        ("errFile", ctypes.c_char_p),
+        ("command", ctypes.c_char_p),
+        ("newCommand", ctypes.c_char_p),
+        ("chkpntPeriod", ctypes.c_long),
+        ("chkpntDir", ctypes.c_char_p),
+        ("nxf", ctypes.c_int),
+        ("xf", ctypes.c_void_p),
+        ("preExecCmd", ctypes.c_char_p),
+        ("mailUser", ctypes.c_char_p),
+        ("delOptions", ctypes.c_int),
+        ("delOptions2", ctypes.c_int),
+        ("projectName", ctypes.c_char_p),
+        ("maxNumProcessors", ctypes.c_int),
+        ("loginShell", ctypes.c_char_p),
+        ("userPriority", ctypes.c_int),
+    ]
+
+
+class _LsbSubmitReply(ctypes.Structure):
+    # struct submitReply from lsbatch.h
+    _fields_ = [
+        ("queue", ctypes.c_char_p),
+        ("badJobId", ctypes.c_longlong),
+        ("badJobName", ctypes.c_char_p),
+        ("badReqIndx", ctypes.c_int),
+    ]
+
+
+class _LsbJobInfoEnt(ctypes.Structure):
+    # The leading fields of struct jobInfoEnt from lsbatch.h, only ever accessed through a pointer returned by
+    # lsb_readjobinfo, so the remaining fields do not need to be described.
+    _fields_ = [
+        ("jobId", ctypes.c_longlong),
+        ("user", ctypes.c_char_p),
+        ("status", ctypes.c_int),
+    ]
 
 
 class OpenLavaCAPIManager(JobManager):
+    """
+    Job Manager for OpenLava that calls the batch library, liblsbatch, directly using ctypes, rather than running the
+    command line tools, so no process is started for any operation.  At the start of each poll cycle the state of
+    every job belonging to the user is read with a single lsb_openjobinfo() call.
+
+    The library to load can be set with --lsbatch_library, which also allows a stub library to be used for testing
+    without a cluster, tools/check_capi_manager.py runs the manager against the stub in tools/stub_lsbatch.c.
+    """
     scheduler_name = "openlava_c_api"
 
-    def start_job(self):
-        pass
+    # Submission options, from lsbatch.h
+    SUB_JOB_NAME = 0x01
+    SUB_QUEUE = 0x02
+    SUB_PROJECT_NAME = 0x2000000
+    DEFAULT_RLIMIT = -1
+    # lsb_openjobinfo options
+    ALL_JOB = 0x0001
+    # Job status bits
+    JOB_STAT_PEND = 0x01
+    JOB_STAT_PSUSP = 0x02
+    JOB_STAT_RUN = 0x04
+    JOB_STAT_SSUSP = 0x08
+    JOB_STAT_USUSP = 0x10
+    JOB_STAT_EXIT = 0x20
+    JOB_STAT_DONE = 0x40
+    JOB_STAT_UNKWN = 0x10000
+
+    @classmethod
+    def add_argparse_arguments(cls, parser):
+        parser.add_argument("--lsbatch_library", type=str, default=None,
+                            help="The path to the OpenLava batch library, defaults to finding liblsbatch.")
+
+    def __init__(self):
+        super(OpenLavaCAPIManager, self).__init__()
+        self.lib = None
+        # The library keeps global state, so only one call is made at a time.
+        self._lock = threading.Lock()
+        # Snapshot of every job belonging to the user for the current poll cycle, {job_id: {array_index: state}}
+        self._job_states = None
+        self._queried_job_ids = set()
+        # The number of tasks of each array job submitted by this manager, {job_id: num_tasks}
+        self.job_sizes = {}
+
+    def initialize(self, parsed_args):
+        super(OpenLavaCAPIManager, self).initialize(parsed_args)
+        path = parsed_args.lsbatch_library or ctypes.util.find_library("lsbatch") or "liblsbatch.so"
+        self.load_library(path)
+
+    def load_library(self, path):
+        """
+        Loads the batch library from path, and initializes it.
+        """
+        logging.debug("Loading OpenLava batch library: %s" % path)
+        lib = ctypes.CDLL(path, mode=ctypes.RTLD_GLOBAL)
+        lib.lsb_init.argtypes = [ctypes.c_char_p]
+        lib.lsb_init.restype = ctypes.c_int
+        lib.lsb_submit.argtypes = [ctypes.POINTER(_LsbSubmit), ctypes.POINTER(_LsbSubmitReply)]
+        lib.lsb_submit.restype = ctypes.c_longlong
+        lib.lsb_openjobinfo.argtypes = [ctypes.c_longlong, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+                                        ctypes.c_char_p, ctypes.c_int]
+        lib.lsb_openjobinfo.restype = ctypes.c_int
+        lib.lsb_readjobinfo.argtypes = [ctypes.POINTER(ctypes.c_int)]
+        lib.lsb_readjobinfo.restype = ctypes.POINTER(_LsbJobInfoEnt)
+        lib.lsb_closejobinfo.argtypes = []
+        lib.lsb_closejobinfo.restype = None
+        lib.lsb_signaljob.argtypes = [ctypes.c_longlong, ctypes.c_int]
+        lib.lsb_signaljob.restype = ctypes.c_int
+        lib.lsb_sysmsg.argtypes = []
+        lib.lsb_sysmsg.restype = ctypes.c_char_p
+        if lib.lsb_init("lavaStorm") < 0:
+            raise RuntimeError("Unable to initialize OpenLava batch library: %s" % lib.lsb_sysmsg())
+        self.lib = lib
+
+    @staticmethod
+    def _lsb_job_id(job_id, array_index):
+        return (array_index << 32) | job_id
+
+    def begin_poll_cycle(self):
+        self._job_states = None
+        self._queried_job_ids = set()
+
+    def _read_job_info(self, job_id, user):
+        """
+        Reads the state of every matching job, returns {job_id: {array_index: state}}.  Must be called with the lock
+        held.
+        """
+        states = {}
+        if self.lib.lsb_openjobinfo(job_id, None, user, None, None, self.ALL_JOB) < 0:
+            # No matching jobs
+            return states
+        try:
+            more = ctypes.c_int(0)
+            while True:
+                entry = self.lib.lsb_readjobinfo(ctypes.byref(more))
+                if not entry:
+                    break
+                lsb_job_id = entry.contents.jobId
+                states.setdefault(lsb_job_id & 0xFFFFFFFF, {})[(lsb_job_id >> 32) & 0xFFFF] = \
+                    self._job_state(entry.contents.status)
+                if more.value == 0:
+                    break
+        finally:
+            self.lib.lsb_closejobinfo()
+        return states
+
+    def _get_job_states(self, job_id):
+        with self._lock:
+            if self._job_states is None:
+                self._job_states = self._read_job_info(0, getpass.getuser())
+            if job_id not in self._job_states and job_id not in self._queried_job_ids:
+                self._queried_job_ids.add(job_id)
+                self._job_states.update(self._read_job_info(job_id, "all"))
+            return self._job_states.get(job_id, {})
+
+    def start_job(self, num_tasks, requested_slots=None, project_name=None, command=None, queue_name=None):
+        request = _LsbSubmit()
+        reply = _LsbSubmitReply()
+        for i in range(len(request.rLimits)):
+            request.rLimits[i] = self.DEFAULT_RLIMIT
+        request.command = command
+        request.numProcessors = requested_slots or 1
+        request.maxNumProcessors = requested_slots or 1
+        if num_tasks > 1:
+            request.options |= self.SUB_JOB_NAME
+            request.jobName = "LavaStorm[1-%d]" % num_tasks
+        if queue_name:
+            request.options |= self.SUB_QUEUE
+            request.queue = queue_name
+        if project_name:
+            request.options |= self.SUB_PROJECT_NAME
+            request.projectName = project_name
+
+        logging.debug("Submitting job: %s" % command)
+        with self._lock:
+            job_id = self.lib.lsb_submit(ctypes.byref(request), ctypes.byref(reply))
+            if job_id < 0:
+                raise RuntimeError("Unable to submit job: %s" % self.lib.lsb_sysmsg())
+
+        task_range = TaskRange.for_job(job_id, num_tasks)
+        self.job_sizes[task_range.job_id] = task_range.last_index
+        return task_range
+
+    @classmethod
+    def _job_state(cls, status):
+        if status & cls.JOB_STAT_DONE:
+            return JOB_COMPLETED
+        if status & cls.JOB_STAT_EXIT:
+            return JOB_FAILED
+        if status & (cls.JOB_STAT_PSUSP | cls.JOB_STAT_SSUSP | cls.JOB_STAT_USUSP):
+            return JOB_SUSPENDED
+        if status & cls.JOB_STAT_PEND:
+            return JOB_PENDING
+        # Running, or unknown, which is treated as running in the same way as bjobs
+        return JOB_RUNNING
+
+    def _get_task_state(self, job_id, array_index):
+        state = self._get_job_states(job_id).get(array_index, None)
+        if state is None:
+            logging.warning("Job %s[%s] is not known to OpenLava, assuming it was killed." % (job_id, array_index))
+            return JOB_KILLED
+        return state
+
+    def get_task_states(self, job_id):
+        job_id = int(job_id)
+        states = self._get_job_states(job_id)
+        if len(states) == 0:
+            # The whole job has gone, its state is reported for every index, so that array jobs are retired too.
+            state = self._get_task_state(job_id, 0)
+            return [(array_index, state) for array_index in range(1, self.job_sizes.get(job_id, 0) + 1) or [0]]
+        return states.items()
 
     def get_jobs(self, job_id):
-        pass
+        job_id = int(job_id)
+        return [OpenLavaCAPIJob(self, job_id, array_index, state=state)
+                for array_index, state in self.get_task_states(job_id)]
 
     def get_job(self, job_id, array_index):
-        pass
+        job_id = int(job_id)
+        array_index = int(array_index)
+        return OpenLavaCAPIJob(self, job_id, array_index, state=self._get_task_state(job_id, array_index))
+
+    def kill_task(self, job_id, array_index):
+        with self._lock:
+            if self.lib.lsb_signaljob(self._lsb_job_id(int(job_id), int(array_index)), signal.SIGKILL) < 0:
+                raise RuntimeError("Unable to kill job %s[%s]: %s" % (job_id, array_index, self.lib.lsb_sysmsg()))
+
+    def kill_jobs(self, task_ranges):
+        # Signalling array index zero kills every task of the job, so only jobs with some tasks already finished need
+        # one call per task.
+        for task_range in task_ranges:
+            if len(task_range) == task_range.num_tasks:
+                array_indexes = [0]
+            else:
+                array_indexes = task_range
+            for array_index in array_indexes:
+                try:
+                    self.kill_task(task_range.job_id, array_index)
+                except RuntimeError as e:
+                    logging.warning("%s" % e)
 
-    def submit_job(self, **kwargs):
-        pass
 
-    class SimpleJob(object):
-        def __init__(self, job_id, array_index=None):
-            pass
+class SimulatedJob(SimpleJob):
+    """
+    SimpleJob Implementation for the SimulatedJobManager
+    """
+    __slots__ = ("manager",)
 
-        def kill(self):
-            pass
+    def __init__(self, manager, job_id, array_index, **kwargs):
+        super(SimulatedJob, self).__init__(job_id, array_index, **kwargs)
+        self.manager = manager
+
+    def kill(self):
+        self.manager.kill_task(self.job_id, self.array_index)
+
+
+class SimulatedTask(object):
+    """
+    A single task inside the SimulatedJobManager.
+    """
+    __slots__ = ("seq", "job_id", "array_index", "slots", "runtime", "exit_status", "queue_name", "project_name",
+                 "state", "hosts", "end_time")
+
+    def __init__(self, seq, job_id, array_index, slots, runtime, exit_status, queue_name, project_name):
+        self.seq = seq
+        self.job_id = job_id
+        self.array_index = array_index
+        self.slots = slots
+        self.runtime = runtime
+        self.exit_status = exit_status
+        self.queue_name = queue_name
+        self.project_name = project_name
+        self.state = JOB_PENDING
+        self.hosts = []
+        self.end_time = None
+
+
+class SimulatedJobManager(JobManager):
+    """
+    Job Manager that models a cluster in process, instead of talking to a real scheduler.  The cluster is made up of
+    a number of hosts, each with a number of slots, and a number of queues, each with a priority.  Pending tasks are
+    dispatched from the highest priority queue first, and within a queue either in submission order (fifo), or to the
+    project using the fewest slots first (fairshare).  There is no backfill, a task that does not fit blocks all tasks
+    behind it.
+
+    Tasks run for the number of seconds given by the sleep in their command, and exit with the status given by its
+    exit, which matches the commands created by Profile.create_job_command().
+
+    Time is taken from a SimulatedClock by default, so a profile sleeping until its next wakeup moves the cluster
+    forward instantly, and days of activity can be replayed in seconds.  With an AcceleratedClock the cluster instead
+    acts as a local stand in for a real scheduler, running N times faster than real time.
+    """
+    scheduler_name = "simulated"
+    supports_virtual_time = True
+
+    @classmethod
+    def add_argparse_arguments(cls, parser):
+        parser.add_argument("--sim_hosts", type=int, default=10,
+                            help="The number of hosts in the simulated cluster.")
+        parser.add_argument("--sim_slots_per_host", type=int, default=8,
+                            help="The number of slots on each host in the simulated cluster.")
+        parser.add_argument("--sim_queue", type=str, dest="sim_queues", action="append", default=[],
+                            help="A queue in the simulated cluster, in the format NAME:PRIORITY.  The first queue "
+                                 "is the default queue.  Default: a single queue named normal.")
+        parser.add_argument("--sim_policy", type=str, default="fifo", choices=["fifo", "fairshare"],
+                            help="How pending tasks in the same queue are ordered for dispatch.")
+
+    def __init__(self):
+        super(SimulatedJobManager, self).__init__()
+        self.clock = SimulatedClock()
+        self.policy = "fifo"
+        self.queues = [("normal", 0)]
+        self._free_slots = [8] * 10
+        self._total_slots = 80
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._next_job_id = 1
+        # {job_id: [SimulatedTask]}
+        self._jobs = {}
+        # Pending tasks by queue name, in submission order
+        self._pending = {"normal": []}
+        # Running tasks as a heap of (end_time, seq, task)
+        self._running = []
+        # Number of slots in use by each project
+        self._project_slots = {}
+
+    def initialize(self, parsed_args):
+        super(SimulatedJobManager, self).initialize(parsed_args)
+        self.policy = parsed_args.sim_policy
+        self._free_slots = [parsed_args.sim_slots_per_host] * parsed_args.sim_hosts
+        self._total_slots = sum(self._free_slots)
+        if parsed_args.sim_queues:
+            self.queues = []
+            for q in parsed_args.sim_queues:
+                name, c, priority = q.partition(":")
+                self.queues.append((name, int(priority or 0)))
+        self._pending = dict((name, []) for name, priority in self.queues)
+
+    @staticmethod
+    def _parse_command(command):
+        """
+        Returns the runtime in seconds, and exit status, of a job command in the format "sleep N; exit M".
+        """
+        runtime = 0
+        exit_status = 0
+        match = re.search(r'sleep (\d+)', command or "")
+        if match:
+            runtime = int(match.group(1))
+        match = re.search(r'exit (\d+)', command or "")
+        if match:
+            exit_status = int(match.group(1))
+        return runtime, exit_status
+
+    def _select(self, pending):
+        if self.policy == "fairshare":
+            return min(pending, key=lambda t: (self._project_slots.get(t.project_name, 0), t.seq))
+        return pending[0]
+
+    def _dispatch(self, now):
+        """
+        Starts pending tasks, highest priority queue first, until a task does not fit in the free slots.
+        """
+        for name, priority in sorted(self.queues, key=lambda q: -q[1]):
+            pending = self._pending[name]
+            while len(pending) > 0:
+                task = self._select(pending)
+                if task.slots > sum(self._free_slots):
+                    return
+                pending.remove(task)
+                needed = task.slots
+                for host, free in enumerate(self._free_slots):
+                    used = min(free, needed)
+                    if used > 0:
+                        self._free_slots[host] -= used
+                        task.hosts.append((host, used))
+                        needed -= used
+                    if needed == 0:
+                        break
+                self._project_slots[task.project_name] = self._project_slots.get(task.project_name, 0) + task.slots
+                task.state = JOB_RUNNING
+                task.end_time = now + datetime.timedelta(seconds=task.runtime)
+                heapq.heappush(self._running, (task.end_time, task.seq, task))
+
+    def _release(self, task):
+        for host, used in task.hosts:
+            self._free_slots[host] += used
+        task.hosts = []
+        self._project_slots[task.project_name] -= task.slots
+
+    def _advance(self):
+        """
+        Moves the cluster forward to the current time of the clock, finishing tasks in the order they end, and
+        dispatching pending tasks into the slots they free at the time they are freed.
+        """
+        now = self.clock.now()
+        while len(self._running) > 0 and self._running[0][0] <= now:
+            end_time, seq, task = heapq.heappop(self._running)
+            if task.state != JOB_RUNNING:
+                # Killed while running
+                continue
+            self._release(task)
+            if task.exit_status == 0:
+                task.state = JOB_COMPLETED
+            else:
+                task.state = JOB_FAILED
+            self._dispatch(end_time)
+        self._dispatch(now)
+
+    def begin_poll_cycle(self):
+        with self._lock:
+            self._advance()
+
+    def start_job(self, num_tasks, requested_slots=None, project_name=None, command=None, queue_name=None):
+        slots = requested_slots or 1
+        if slots > self._total_slots:
+            raise ValueError("Job requests %d slots, more than the simulated cluster has." % slots)
+        queue_name = queue_name or self.queues[0][0]
+        if queue_name not in self._pending:
+            raise ValueError("Queue %s does not exist in the simulated cluster." % queue_name)
+        runtime, exit_status = self._parse_command(command)
+
+        with self._lock:
+            self._advance()
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            if num_tasks > 1:
+                array_indexes = range(1, num_tasks + 1)
+            else:
+                array_indexes = [0]
+            tasks = [SimulatedTask(next(self._seq), job_id, i, slots, runtime, exit_status, queue_name, project_name)
+                     for i in array_indexes]
+            self._jobs[job_id] = tasks
+            self._pending[queue_name].extend(tasks)
+            self._dispatch(self.clock.now())
+
+        logging.debug("Simulated job %d submitted to queue %s with %d tasks" % (job_id, queue_name, len(tasks)))
+        return TaskRange.for_job(job_id, num_tasks)
+
+    def _get_simple_job(self, task):
+        return SimulatedJob(self, task.job_id, task.array_index, state=task.state)
+
+    def get_jobs(self, job_id):
+        with self._lock:
+            self._advance()
+            return [self._get_simple_job(t) for t in self._jobs[int(job_id)]]
+
+    def get_task_states(self, job_id):
+        with self._lock:
+            self._advance()
+            return [(t.array_index, t.state) for t in self._jobs[int(job_id)]]
+
+    def get_job(self, job_id, array_index):
+        with self._lock:
+            self._advance()
+            for task in self._jobs[int(job_id)]:
+                if task.array_index == int(array_index):
+                    return self._get_simple_job(task)
+        raise ValueError("Job %s[%s] does not exist." % (job_id, array_index))
+
+    def kill_task(self, job_id, array_index):
+        with self._lock:
+            self._advance()
+            for task in self._jobs[int(job_id)]:
+                if task.array_index != int(array_index):
+                    continue
+                if task.state == JOB_PENDING:
+                    self._pending[task.queue_name].remove(task)
+                elif task.state == JOB_RUNNING:
+                    self._release(task)
+                else:
+                    return
+                task.state = JOB_KILLED
+            self._dispatch(self.clock.now())
+
+    def kill_jobs(self, task_ranges):
+        for task_range in task_ranges:
+            for array_index in task_range:
+                self.kill_task(task_range.job_id, array_index)
 
 
 class BaseLoadProfile(Profile, object):
@@ -1084,7 +3102,7 @@ class SubmitBatchProfile(Profile, object):
         sub_parser.add_argument("--max_num_jobs_per_batch", type=int, default=10,
                                 help="The maximum number of jobs that should be submitted each time")
         sub_parser.add_argument("--iterations", type=int, default=0,
-                                help="The number of iterations to do before exiting.")
+                                help="The number of iterations to do before finishing.")
 
     sub_command_name = "submitbatch"
     sub_command_help = \
@@ -1103,8 +3121,9 @@ class SubmitBatchProfile(Profile, object):
             return
 
         if self.iterations != 0 and self.sum_submitted_batches >= self.iterations:
-            logging.info("Maximum number of iterations reached, exiting.")
-            sys.exit(0)
+            logging.info("Maximum number of iterations reached, finishing.")
+            self.finished = True
+            return
         self.sum_submitted_batches += 1
 
         # Number of jobs to submit in this batch.
@@ -1126,6 +3145,236 @@ class SubmitBatchProfile(Profile, object):
             self.submit_queue.append(job_data)
 
 
+class Storm(object):
+    """
+    A storm runs a population of profiles in a single process, simulating many users at once.  Every profile shares
+    the same job manager and submission pool, so the scheduler is queried once per poll cycle for the whole
+    population rather than once per user, and jobs from all users that become due together are submitted together.
+
+    The population is described by a JSON file containing a list of entries.  Each entry gives the command line
+    arguments for a profile, exactly as they would be given to LavaStorm, and the number of users that should run that
+    profile.  Scheduler options, poll_interval, and submit_concurrency are taken from the storm's own command line.::
+
+        [
+            {"count": 150, "arguments": "--office_hours 09:00:00-17:00:00 --queue normal baseload --base_load 2"},
+            {"count": 10, "arguments": "--project crash --queue short submitbatch --max_num_jobs_per_batch 200"}
+        ]
+
+    """
+    sub_command_name = "storm"
+    sub_command_help = "Runs a population of profiles, described in a JSON file, in a single process."
+
+    @classmethod
+    def add_arguments(cls, sub_parser):
+        sub_parser.add_argument("population", type=str,
+                                help="JSON file describing the profiles to run and how many users run each one.")
+
+    def __init__(self):
+        self.manager = None
+        self.submit_pool = None
+        self.population = None
+        self.poll_interval = 10  # seconds
+        self.duration = 0  # seconds, zero to run until interrupted
+        self.clock = Clock()
+        self.metrics = None
+        self.latency = LatencyRecorder()
+        self.latency_report = None
+        self.profiles = []
+
+    def load_population(self, parser):
+        """
+        Reads the population file, and creates a profile for each user.
+
+        :param parser: Argument parser used to parse the arguments of each entry.
+        :return: None
+
+        """
+        with open(self.population) as f:
+            entries = json.load(f)
+
+        for entry in entries:
+            arguments = entry['arguments']
+            if isinstance(arguments, basestring):
+                arguments = shlex.split(arguments)
+            for i in range(entry.get('count', 1)):
+                args = parser.parse_args(arguments)
+                if not issubclass(args.cls, Profile):
+                    parser.error("Population entries must select a profile: %s" % " ".join(arguments))
+                try:
+                    profile = create_profile(args, self.manager)
+                except ValueError:
+                    parser.error("Invalid time range supplied: %s" % " ".join(arguments))
+                profile.poll_interval = self.poll_interval
+                profile.submit_pool = self.submit_pool
+                profile.metrics = self.metrics
+                profile.latency = self.latency
+                self.profiles.append(profile)
+
+        if len(self.profiles) < 1:
+            parser.error("The population does not contain any profiles.")
+        logging.info("Loaded a population of %d profiles." % len(self.profiles))
+
+    def poll(self):
+        """
+        Takes a single snapshot of the scheduler, then updates the status of every profile from it.
+
+        :return: None
+
+        """
+        self.manager.begin_poll_cycle()
+        for profile in self.get_unfinished_profiles():
+            profile.poll()
+        logging.info("Storm Activity: %d profiles, %d jobs waiting to submit, %d jobs active, %d tasks total." %
+                     (
+                         len(self.profiles),
+                         sum(len(p.submit_queue) for p in self.profiles),
+                         sum(p.total_active_jobs for p in self.profiles),
+                         sum(p.total_task_count for p in self.profiles),
+                     ))
+
+    def start_jobs(self):
+        """
+        Submits the jobs of every profile that are due.  When a submission pool is used, the due jobs of all profiles
+        are submitted through it together.
+
+        :return: None
+
+        """
+        if self.submit_pool is None:
+            for profile in self.get_unfinished_profiles():
+                profile.start_jobs()
+            return
+
+        now = self.clock.now()
+        owners = {}
+        jobs = []
+        for profile in self.get_unfinished_profiles():
+            for job in profile.submit_queue.pop_due(now):
+                owners[id(job['job'])] = profile
+                jobs.append(job['job'])
+        logging.debug("Jobs to process: %d" % len(jobs))
+        self.submit_pool.start_jobs(self.manager, jobs,
+                                    lambda job, tasks, seconds: owners[id(job)].job_submitted(job, tasks, seconds))
+
+    def run(self):
+        """
+        Runs every profile in the population until interrupted, until every profile has finished, or until duration
+        seconds have passed if a duration is set, then kills all active jobs.  Whenever any profile is due to poll, all
+        unfinished profiles are polled from the same snapshot, which keeps their poll cycles aligned.
+
+        :return: None
+
+        """
+        self.load_population(get_parser())
+        end_time = None
+        if self.duration:
+            end_time = self.clock.now() + datetime.timedelta(seconds=self.duration)
+        try:
+            while end_time is None or self.clock.now() < end_time:
+                if any(p.is_poll_due() for p in self.get_unfinished_profiles()):
+                    poll_start = time.time()
+                    self.poll()
+                    if self.metrics is not None:
+                        self.metrics.sample(self.clock.now(), self.profiles, time.time() - poll_start)
+                unfinished = self.get_unfinished_profiles()
+                if len(unfinished) < 1:
+                    logging.info("Every profile has finished.")
+                    break
+                self.start_jobs()
+                wakeup = min(p.get_next_wakeup_time() for p in unfinished)
+                if end_time is not None and end_time < wakeup:
+                    wakeup = end_time
+                self.clock.sleep_until(wakeup)
+            else:
+                logging.info("Duration reached. Killing all active jobs.")
+        except KeyboardInterrupt:
+            logging.info("Terminating. Killing all active jobs.")
+        self.kill_all_jobs()
+        if self.metrics is not None:
+            self.metrics.flush()
+        self.latency.log_report()
+        if self.latency_report:
+            self.latency.write_report(self.latency_report)
+
+    def get_unfinished_profiles(self):
+        """
+        Returns the profiles that have not yet finished.  Finished profiles are no longer polled, but are still
+        included in the metrics, and have any remaining jobs killed at the end of the run.
+
+        :return: list of profiles
+
+        """
+        return [p for p in self.profiles if not p.finished]
+
+    def kill_all_jobs(self):
+        """
+        Kills the active tasks of every profile together, so the job manager can batch them into as few requests as
+        possible.
+
+        :return: None
+
+        """
+        self.manager.kill_jobs(itertools.chain.from_iterable(p.active_jobs for p in self.profiles))
+
+
+def parse_office_hours(office_hours):
+    """
+    Converts a list of office hours in the format HH:MM:SS-HH:MM:SS,HH:MM:SS-HH:MM:SS into a list of dictionaries
+    containing a start_time and end_time.  Raises ValueError if the format is invalid.
+    """
+    ranges = []
+    for r in office_hours.split(','):
+        start, c, end = r.partition("-")
+        start = [int(x) for x in start.split(":")]
+        end = [int(x) for x in end.split(":")]
+        ranges.append({
+            'start_time': datetime.time(*start),
+            'end_time': datetime.time(*end),
+        })
+    return ranges
+
+
+def create_clock(clock_type, time_scale):
+    """
+    Creates the clock named by clock_type, one of real, accelerated, or simulated.
+    """
+    if clock_type == "accelerated":
+        return AcceleratedClock(time_scale)
+    if clock_type == "simulated":
+        return SimulatedClock()
+    return Clock()
+
+
+def create_metrics(args):
+    """
+    Creates the MetricsRecorder requested by the parsed arguments, or returns None if metrics are not wanted.
+    """
+    if not args.metrics_file and not args.metrics_port:
+        return None
+    metrics = MetricsRecorder(args.metrics_buffer, args.metrics_file, args.metrics_format)
+    if args.metrics_port:
+        metrics.serve_prometheus(args.metrics_port)
+    return metrics
+
+
+def create_profile(args, manager):
+    """
+    Creates the profile selected by the parsed arguments, and configures it from them.  Raises ValueError if the
+    office hours are invalid.
+    """
+    if args.office_hours:
+        args.office_hours = parse_office_hours(args.office_hours)
+    args.min_observation_time = datetime.timedelta(seconds=args.min_observation_time)
+    args.max_observation_time = datetime.timedelta(seconds=args.max_observation_time)
+
+    prof = args.cls()
+    prof.manager = manager
+    prof.clock = manager.clock
+    for k, v in vars(args).iteritems():
+        setattr(prof, k, v)
+    return prof
+
+
 def get_parser():
     parser = argparse.ArgumentParser(description='Submits load to a batch scheduler')
 
@@ -1151,6 +3400,33 @@ def get_parser():
                         help="The minimum number of tasks per job.  Default  1.")
     parser.add_argument("--max_tasks_per_job", type=int, default=1,
                         help="The maximum number of tasks per job.  Default  1.")
+    parser.add_argument("--poll_interval", type=int, default=10,
+                        help="The number of seconds between checks on the status of submitted jobs.  Default 10.")
+    parser.add_argument("--submit_concurrency", type=int, default=1,
+                        help="The maximum number of jobs that may be in the process of being submitted at once. "
+                             "Default 1.")
+    parser.add_argument("--scheduler_concurrency", type=int, default=16,
+                        help="The maximum number of scheduler commands that may run at once.  Default 16.")
+    parser.add_argument("--clock", type=str, dest="clock_type", default=None,
+                        choices=["real", "accelerated", "simulated"],
+                        help="The clock used to time the run.  Default: the scheduler's own clock.")
+    parser.add_argument("--time_scale", type=float, default=60,
+                        help="How many times faster than real time the accelerated clock runs.  Default 60.")
+    parser.add_argument("--duration", type=int, default=0,
+                        help="The number of seconds to run for before killing all jobs and exiting, zero to run until "
+                             "interrupted.  Default 0.")
+    parser.add_argument("--metrics_file", type=str, default=None,
+                        help="File to append a sample of the job and task counters to after each poll cycle.")
+    parser.add_argument("--metrics_format", type=str, default="csv", choices=MetricsRecorder.formats,
+                        help="The format of the metrics file.  Default csv.")
+    parser.add_argument("--metrics_buffer", type=int, default=1000,
+                        help="The number of metrics samples kept in memory.  Default 1000.")
+    parser.add_argument("--metrics_port", type=int, default=0,
+                        help="Port to serve the latest metrics on in the Prometheus text format, zero to disable.  "
+                             "Default 0.")
+    parser.add_argument("--latency_report", type=str, default=None,
+                        help="File to write the queue wait and turnaround percentiles of each queue and project to, "
+                             "as JSON, at the end of the run.")
 
     parser.add_argument("--queue", type=str, dest="queues", action="append", default=[],
                         help="Queue to submit to, if multiple queues are specified, selects one at random.")
@@ -1162,6 +3438,9 @@ def get_parser():
         p = subparsers.add_parser(cls.sub_command_name, help=cls.sub_command_help)
         cls.add_arguments(p)
         p.set_defaults(cls=cls)
+    p = subparsers.add_parser(Storm.sub_command_name, help=Storm.sub_command_help)
+    Storm.add_arguments(p)
+    p.set_defaults(cls=Storm)
     return parser
 
 
@@ -1182,23 +3461,6 @@ if __name__ == "__main__":
                      help="Scheduler interface to use")
 
     args = prs.parse_args()
-    try:
-        if args.office_hours:
-            ranges = []
-            for r in args.office_hours.split(','):
-                start, c, end = r.partition("-")
-                start = [int(x) for x in start.split(":")]
-                end = [int(x) for x in end.split(":")]
-                ranges.append({
-                    'start_time': datetime.time(*start),
-                    'end_time': datetime.time(*end),
-                })
-            args.office_hours = ranges
-    except ValueError:
-        sys.stderr.write("Invalid time range supplied\n")
-        sys.exit(1)
-    args.min_observation_time = datetime.timedelta(seconds=args.min_observation_time)
-    args.max_observation_time = datetime.timedelta(seconds=args.max_observation_time)
 
     # Initialize the job manager, if invalid choice then raise an exception
     manager = None
@@ -1208,10 +3470,18 @@ if __name__ == "__main__":
             manager.initialize(args)
     if not manager:
         raise ValueError("Manager undefined")
+    if args.clock_type:
+        if args.clock_type != "real" and not manager.supports_virtual_time:
+            prs.error("The %s clock can not be used with the %s scheduler." % (args.clock_type, args.scheduler))
+        manager.clock = create_clock(args.clock_type, args.time_scale)
 
-    prof = args.cls()
-    prof.manager = manager
-    for k, v in vars(args).iteritems():
-        setattr(prof, k, v)
+    try:
+        prof = create_profile(args, manager)
+    except ValueError:
+        sys.stderr.write("Invalid time range supplied\n")
+        sys.exit(1)
+    if args.submit_concurrency > 1:
+        prof.submit_pool = SubmissionPool(args.submit_concurrency)
+    prof.metrics = create_metrics(args)
 
     prof.run()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# Copyright 2011 David Irvine
+#
+# This file is part of LavaStorm
+#
+# LavaStorm is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# LavaStorm is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with LavaStorm. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares the time and peak memory used to parse a large qstat -xml document by the streaming parser in
+DirectSGEManager._parse_qstat, and by the minidom parser it replaced.  A synthetic document is generated with the
+requested number of tasks, half running and half pending, then each parser is run in its own process so that their
+peak RSS can be measured separately.
+
+Usage: python tools/bench_qstat_parse.py [--tasks 100000]
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from xml.dom import minidom
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+RUNNING_JOB = """    <job_list state="running">
+      <JB_job_number>%d</JB_job_number>
+      <JAT_prio>0.55500</JAT_prio>
+      <JB_name>STDIN</JB_name>
+      <JB_owner>storm</JB_owner>
+      <state>r</state>
+      <JAT_start_time>2014-08-16T21:59:30</JAT_start_time>
+      <queue_name>all.q@node%03d</queue_name>
+      <slots>1</slots>
+      <tasks>%d</tasks>
+    </job_list>
+"""
+
+PENDING_JOB = """    <job_list state="pending">
+      <JB_job_number>%d</JB_job_number>
+      <JAT_prio>0.55500</JAT_prio>
+      <JB_name>STDIN</JB_name>
+      <JB_owner>storm</JB_owner>
+      <state>qw</state>
+      <JB_submission_time>2014-08-16T21:59:30</JB_submission_time>
+      <queue_name></queue_name>
+      <slots>1</slots>
+      <tasks>%d</tasks>
+    </job_list>
+"""
+
+
+def write_document(f, num_tasks):
+    """
+    Writes a qstat -xml document with num_tasks tasks, in arrays of 100 tasks, to the file f.
+    """
+    f.write("<?xml version='1.0'?>\n<job_info>\n  <queue_info>\n")
+    for i in xrange(num_tasks // 2):
+        f.write(RUNNING_JOB % (1000 + i // 100, i % 200, i % 100 + 1))
+    f.write("  </queue_info>\n  <job_info>\n")
+    for i in xrange(num_tasks // 2, num_tasks):
+        f.write(PENDING_JOB % (1000 + i // 100, i % 100 + 1))
+    f.write("  </job_info>\n</job_info>\n")
+
+
+def parse_minidom(path):
+    """
+    The parser used before the switch to iterparse, which builds a DOM of the whole document.
+    """
+    from lavaStorm import DirectSGEManager
+    with open(path) as f:
+        output = f.read()
+    states = {}
+    xmldoc = minidom.parseString(output)
+    for j in xmldoc.getElementsByTagName('job_list'):
+        job_id = int(j.getElementsByTagName('JB_job_number')[0].firstChild.nodeValue)
+        state = j.getElementsByTagName('state')[0].firstChild.nodeValue
+        tasks = j.getElementsByTagName('tasks')
+        if tasks:
+            for task_id in DirectSGEManager._expand_task_ids(tasks[0].firstChild.nodeValue):
+                states[(job_id, task_id)] = state
+        else:
+            states[(job_id, 0)] = state
+    return states
+
+
+def parse_iterparse(path):
+    from lavaStorm import DirectSGEManager
+    with open(path) as f:
+        return DirectSGEManager._parse_qstat(f)
+
+
+PARSERS = {
+    'minidom': parse_minidom,
+    'iterparse': parse_iterparse,
+}
+
+
+def run_parser(name, path):
+    """
+    Runs a single parser, and prints the number of tasks found, the time taken, and the growth in peak RSS.
+    """
+    # Import before measuring, so that loading lavaStorm is not counted.
+    import lavaStorm
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    states = PARSERS[name](path)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+    print "%-10s %8d tasks %8.2f s  peak RSS +%d MB" % (name, len(states), elapsed, peak / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing of qstat -xml output.")
+    parser.add_argument("--tasks", type=int, default=100000, help="Number of tasks in the generated document")
+    parser.add_argument("--parser", choices=sorted(PARSERS.keys()), default=None,
+                        help="Run only this parser, on the document given by --document")
+    parser.add_argument("--document", default=None, help="Existing qstat -xml document to parse")
+    args = parser.parse_args()
+
+    if args.parser:
+        run_parser(args.parser, args.document)
+        return
+
+    document = args.document
+    if document is None:
+        fd, document = tempfile.mkstemp(suffix=".xml")
+        with os.fdopen(fd, "w") as f:
+            write_document(f, args.tasks)
+    try:
+        print "Document: %s, %d MB" % (document, os.path.getsize(document) / 1048576)
+        for name in ["minidom", "iterparse"]:
+            subprocess.check_call([sys.executable, os.path.abspath(__file__), "--parser", name, "--document", document])
+    finally:
+        if args.document is None:
+            os.unlink(document)
+
+
+if __name__ == "__main__":
+    main()
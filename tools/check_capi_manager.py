@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# Copyright 2011 David Irvine
+#
+# This file is part of LavaStorm
+#
+# LavaStorm is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# LavaStorm is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with LavaStorm. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Exercises OpenLavaCAPIManager against the stub batch library in stub_lsbatch.c, so that the ctypes structures and the
+sequence of library calls can be checked without a cluster.  The stub is compiled with cc unless a library is given
+with --lsbatch_library.  Jobs are submitted, polled until they finish, and killed, and the script exits with an error
+if any state reported by the manager is not the one expected.
+
+Usage: python tools/check_capi_manager.py [--lsbatch_library path/to/stub_lsbatch.so]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lavaStorm import OpenLavaCAPIManager, BaseLoadProfile, JOB_STATE_NAMES, JOB_COMPLETED
+
+STUB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_lsbatch.c")
+
+
+def build_stub(directory):
+    """
+    Compiles the stub library into directory, and returns its path.
+    """
+    path = os.path.join(directory, "stub_lsbatch.so")
+    subprocess.check_call(["cc", "-shared", "-fPIC", "-o", path, STUB_SOURCE])
+    return path
+
+
+def check(description, actual, expected):
+    if actual != expected:
+        raise AssertionError("%s: expected %s, got %s" % (description, expected, actual))
+    print "ok   %s: %s" % (description, actual)
+
+
+def named(task_states):
+    return sorted((array_index, JOB_STATE_NAMES[state]) for array_index, state in task_states)
+
+
+def poll(manager, job_id):
+    manager.begin_poll_cycle()
+    return named(manager.get_task_states(job_id))
+
+
+def run_checks(manager):
+    # A single job and an array job.  The stub moves every task on one step each poll cycle, from pending to running
+    # to done.
+    single = manager.start_job(1, command="sleep 1", queue_name="normal", project_name="storm")
+    array = manager.start_job(3, requested_slots=2, command="sleep 2")
+    check("single job range", (single.first_index, single.last_index), (0, 0))
+    check("array job range", (array.first_index, array.last_index), (1, 3))
+    manager.begin_poll_cycle()
+    check("single job, first poll", named(manager.get_task_states(single.job_id)), [(0, "Running")])
+    check("array job, first poll", named(manager.get_task_states(array.job_id)),
+          [(1, "Running"), (2, "Running"), (3, "Running")])
+
+    # Once some tasks of an array have finished, killing it signals just the active tasks.
+    array.set_state(1, JOB_COMPLETED)
+    array.set_state(3, JOB_COMPLETED)
+    manager.kill_jobs([array])
+    manager.begin_poll_cycle()
+    check("single job, second poll", named(manager.get_task_states(single.job_id)), [(0, "Completed")])
+    check("array job after killing task 2", named(manager.get_task_states(array.job_id)),
+          [(1, "Completed"), (2, "Failed"), (3, "Completed")])
+
+    # Killing a whole array signals index zero, which kills every task.
+    whole = manager.start_job(4, command="sleep 3")
+    manager.kill_jobs([whole])
+    check("array job after killing the whole job", poll(manager, whole.job_id),
+          [(i, "Failed") for i in range(1, 5)])
+
+    # Jobs the library does not know are reported as killed, for every index of an array.
+    manager.job_sizes[9999] = 2
+    check("unknown job", poll(manager, 9999), [(1, "Killed"), (2, "Killed")])
+
+    # A profile polling through the manager retires the tasks once they have finished.
+    profile = BaseLoadProfile()
+    profile.manager = manager
+    profile.clock = manager.clock
+    profile.job_started(2, manager.start_job(2, command="sleep 4"))
+    for i in range(3):
+        manager.begin_poll_cycle()
+        profile.process_running_jobs()
+    check("profile active jobs", len(profile.active_jobs), 0)
+    check("profile completed tasks", profile.completed_task_count, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check OpenLavaCAPIManager against a stub batch library.")
+    OpenLavaCAPIManager.add_argparse_arguments(parser)
+    args = parser.parse_args()
+
+    directory = None
+    if args.lsbatch_library is None:
+        directory = tempfile.mkdtemp()
+        args.lsbatch_library = build_stub(directory)
+    try:
+        manager = OpenLavaCAPIManager()
+        manager.initialize(args)
+        run_checks(manager)
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory)
+    print "All checks passed."
+
+
+if __name__ == "__main__":
+    main()
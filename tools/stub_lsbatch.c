@@ -0,0 +1,216 @@
+/*
+ * Copyright 2011 David Irvine
+ *
+ * This file is part of LavaStorm
+ *
+ * LavaStorm is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or (at
+ * your option) any later version.
+ *
+ * LavaStorm is distributed in the hope that it will be useful, but
+ * WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ * General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with LavaStorm. If not, see <http://www.gnu.org/licenses/>.
+ *
+ * A stand in for the OpenLava batch library, liblsbatch, implementing the calls made by OpenLavaCAPIManager, so the
+ * manager can be run without a cluster.  The structures are laid out as in lsbatch.h.
+ *
+ * Jobs live in memory.  Each task starts pending, and every call to lsb_openjobinfo moves each task on one step, from
+ * pending to running, then from running to done.  Signalling a task marks it as exited, signalling array index zero
+ * signals every task of the job.  Build with:
+ *
+ *     cc -shared -fPIC -o stub_lsbatch.so stub_lsbatch.c
+ */
+#include <stdlib.h>
+#include <string.h>
+
+#define SUB_JOB_NAME 0x01
+
+#define JOB_STAT_PEND 0x01
+#define JOB_STAT_RUN 0x04
+#define JOB_STAT_EXIT 0x20
+#define JOB_STAT_DONE 0x40
+
+#define MAX_TASKS 10000
+#define FIRST_JOB_ID 1000
+
+struct submit {
+    int options;
+    int options2;
+    char *jobName;
+    char *queue;
+    int numAskedHosts;
+    char **askedHosts;
+    char *resReq;
+    int rLimits[12];
+    char *hostSpec;
+    int numProcessors;
+    char *dependCond;
+    long beginTime;
+    long termTime;
+    int sigValue;
+    char *inFile;
+    char *outFile;
+    char *errFile;
+    char *command;
+    char *newCommand;
+    long chkpntPeriod;
+    char *chkpntDir;
+    int nxf;
+    void *xf;
+    char *preExecCmd;
+    char *mailUser;
+    int delOptions;
+    int delOptions2;
+    char *projectName;
+    int maxNumProcessors;
+    char *loginShell;
+    int userPriority;
+};
+
+struct submitReply {
+    char *queue;
+    long long badJobId;
+    char *badJobName;
+    int badReqIndx;
+};
+
+/* The leading fields of struct jobInfoEnt, the only ones the manager reads. */
+struct jobInfoEnt {
+    long long jobId;
+    char *user;
+    int status;
+};
+
+static struct jobInfoEnt tasks[MAX_TASKS];
+static int num_tasks = 0;
+static int next_job_id = FIRST_JOB_ID;
+static const char *message = "No error";
+
+/* The job id and position of the jobs being read between lsb_openjobinfo and lsb_closejobinfo. */
+static long long read_job_id = 0;
+static int read_position = 0;
+
+static int job_part(long long lsb_job_id) {
+    return (int) (lsb_job_id & 0xFFFFFFFF);
+}
+
+static int index_part(long long lsb_job_id) {
+    return (int) ((lsb_job_id >> 32) & 0xFFFF);
+}
+
+static int matches(struct jobInfoEnt *task) {
+    return read_job_id == 0 || job_part(task->jobId) == read_job_id;
+}
+
+int lsb_init(char *appName) {
+    return 0;
+}
+
+char *lsb_sysmsg(void) {
+    return (char *) message;
+}
+
+long long lsb_submit(struct submit *request, struct submitReply *reply) {
+    int count = 1;
+    int first_index = 0;
+    int i;
+    char *range;
+
+    memset(reply, 0, sizeof(*reply));
+    if (request->command == NULL) {
+        message = "No command given";
+        return -1;
+    }
+    /* Array jobs are named NAME[1-N] */
+    if ((request->options & SUB_JOB_NAME) && (range = strchr(request->jobName, '[')) != NULL) {
+        first_index = 1;
+        count = atoi(strchr(range, '-') + 1);
+    }
+    if (num_tasks + count > MAX_TASKS) {
+        message = "Too many jobs";
+        return -1;
+    }
+    for (i = 0; i < count; i++) {
+        tasks[num_tasks].jobId = ((long long) (first_index + i) << 32) | next_job_id;
+        tasks[num_tasks].user = "lavastorm";
+        tasks[num_tasks].status = JOB_STAT_PEND;
+        num_tasks++;
+    }
+    return next_job_id++;
+}
+
+int lsb_openjobinfo(long long jobId, char *jobName, char *userName, char *queueName, char *hostName, int options) {
+    int i;
+    int found = 0;
+
+    read_job_id = jobId;
+    read_position = 0;
+    for (i = 0; i < num_tasks; i++) {
+        if (!matches(&tasks[i])) {
+            continue;
+        }
+        if (tasks[i].status == JOB_STAT_PEND) {
+            tasks[i].status = JOB_STAT_RUN;
+        } else if (tasks[i].status == JOB_STAT_RUN) {
+            tasks[i].status = JOB_STAT_DONE;
+        }
+        found++;
+    }
+    if (found == 0) {
+        message = "No matching job found";
+        return -1;
+    }
+    return found;
+}
+
+struct jobInfoEnt *lsb_readjobinfo(int *more) {
+    int i;
+
+    while (read_position < num_tasks && !matches(&tasks[read_position])) {
+        read_position++;
+    }
+    if (read_position >= num_tasks) {
+        *more = 0;
+        return NULL;
+    }
+    *more = 0;
+    for (i = read_position + 1; i < num_tasks; i++) {
+        if (matches(&tasks[i])) {
+            (*more)++;
+        }
+    }
+    return &tasks[read_position++];
+}
+
+void lsb_closejobinfo(void) {
+    read_job_id = 0;
+    read_position = 0;
+}
+
+int lsb_signaljob(long long jobId, int sigValue) {
+    int i;
+    int found = 0;
+
+    for (i = 0; i < num_tasks; i++) {
+        if (job_part(tasks[i].jobId) != job_part(jobId)) {
+            continue;
+        }
+        if (index_part(jobId) != 0 && index_part(tasks[i].jobId) != index_part(jobId)) {
+            continue;
+        }
+        if (tasks[i].status == JOB_STAT_PEND || tasks[i].status == JOB_STAT_RUN) {
+            tasks[i].status = JOB_STAT_EXIT;
+        }
+        found++;
+    }
+    if (found == 0) {
+        message = "No matching job found";
+        return -1;
+    }
+    return 0;
+}